@@ -0,0 +1,156 @@
+import features
+import util
+from constants import SPOTIFY_RETRY_STATUS_CODES
+from playlist_index import get_playlist_id, get_playlist_ids
+from spotify_client import CachingSpotify, RateLimitedSpotify
+from track_store import TRACKS
+
+
+def create_client(calls_per_second=None):
+    """
+    Returns a Spotify client authenticated with the values from the environment or the .env file.
+    If calls_per_second is given, the client makes at most that many API calls per second.
+    spotipy and dotenv are only imported here, so that importing the API stays fast
+    """
+
+    import spotipy
+    from dotenv import load_dotenv
+    from spotipy.oauth2 import SpotifyOAuth
+
+    load_dotenv()
+    sp = spotipy.Spotify(
+        auth_manager=SpotifyOAuth(scope='playlist-modify-private playlist-modify-public'),
+        requests_session=create_session(),
+        requests_timeout=100)
+    if calls_per_second:
+        sp = RateLimitedSpotify(sp, calls_per_second)
+    return CachingSpotify(sp)
+
+
+def create_session():
+    """
+    Returns the HTTP session for the Spotify client. It retries server errors like spotipy's own session,
+    but raises rate limits, which that one waits out silently whenever Retry-After is given, so that
+    call_with_backoff waits for them and counts them
+    """
+
+    import requests
+    from urllib3.util.retry import Retry
+
+    retry = Retry(total=10, connect=None, read=False, allowed_methods=frozenset(['GET', 'POST', 'PUT', 'DELETE']),
+                  status=3, backoff_factor=0.3, status_forcelist=SPOTIFY_RETRY_STATUS_CODES,
+                  respect_retry_after_header=False)
+    session = requests.Session()
+    adapter = requests.adapters.HTTPAdapter(max_retries=retry)
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    return session
+
+
+def shuffle(main_playlist, good_playlist=None, best_playlist=None, should_shuffle=True, should_reorder=True,
+            dry_run=False, sp=None):
+    """
+    Shuffles the playlist with the given name and reorders it, so that its clones are not close to each other.
+    Reordering needs the Good and Best playlists
+    """
+
+    if not should_shuffle and not should_reorder:
+        raise ValueError('Shuffling and reordering are both turned off, so there is nothing to do')
+    if should_reorder:
+        check_good_and_best_playlists(good_playlist, best_playlist, 'Reordering')
+    sp = sp or create_client()
+    if should_reorder:
+        main_playlist_id, good_playlist_id, best_playlist_id = get_playlist_ids(
+            sp, [main_playlist, good_playlist, best_playlist])
+    else:
+        main_playlist_id, good_playlist_id, best_playlist_id = get_playlist_id(sp, main_playlist), None, None
+    return features.shuffle(sp, main_playlist_id, good_playlist_id, best_playlist_id, should_shuffle, should_reorder,
+                            dry_run)
+
+
+def reorder(main_playlist, good_playlist, best_playlist, dry_run=False, sp=None):
+    """ Reorders the playlist with the given name without shuffling it """
+
+    return shuffle(main_playlist, good_playlist, best_playlist, should_shuffle=False, dry_run=dry_run, sp=sp)
+
+
+def test(main_playlist, good_playlist, best_playlist, sp=None):
+    """ Checks whether the playlist with the given name is well-ordered and its clones are in Good and Best """
+
+    check_good_and_best_playlists(good_playlist, best_playlist, 'Testing')
+    sp = sp or create_client()
+    return util.test(sp, *get_playlist_ids(sp, [main_playlist, good_playlist, best_playlist]))
+
+
+def check_good_and_best_playlists(good_playlist, best_playlist, feature_name):
+    """ Raises a ValueError if the Good or Best playlist, which the given feature needs, is not given """
+
+    if not good_playlist or not best_playlist:
+        raise ValueError(f'{feature_name} needs the names of the Good and Best playlists')
+
+
+def union(*playlists, sp=None):
+    """ Returns the tracks present in any of the playlists with the given names """
+
+    check_set_operation_playlists(playlists, 'Union')
+    sp = sp or create_client()
+    result = features.get_union(sp, *get_playlist_ids(sp, playlists))
+    return get_tracks_with_multiplicities(result)
+
+
+def intersection(*playlists, sp=None):
+    """ Returns the tracks present in all the playlists with the given names """
+
+    check_set_operation_playlists(playlists, 'Intersection')
+    sp = sp or create_client()
+    result = features.get_intersection(sp, *get_playlist_ids(sp, playlists))
+    return get_tracks_with_multiplicities(result)
+
+
+def difference(base_playlist, *playlists, sp=None):
+    """ Returns the tracks present in the first playlist but missing from all the other ones """
+
+    check_set_operation_playlists((base_playlist, *playlists), 'Difference')
+    sp = sp or create_client()
+    result = features.get_difference(sp, *get_playlist_ids(sp, [base_playlist, *playlists]))
+    return get_tracks_with_multiplicities(result)
+
+
+def symmetric_difference(*playlists, sp=None):
+    """ Returns the tracks present in exactly one of the playlists with the given names """
+
+    check_set_operation_playlists(playlists, 'Symmetric difference')
+    sp = sp or create_client()
+    result = features.get_symmetric_difference(sp, *get_playlist_ids(sp, playlists))
+    return get_tracks_with_multiplicities(result)
+
+
+def check_set_operation_playlists(playlists, feature_name):
+    """ Raises a ValueError if fewer than two playlists are given to the given set operation """
+
+    if len(playlists) < 2:
+        raise ValueError(f'{feature_name} needs the names of two or more playlists')
+
+
+def get_tracks_with_multiplicities(result):
+    """ Returns the result of a set operation with the track IDs turned into track dicts """
+
+    return [(TRACKS.get_track(track), multiplicities) for track, multiplicities in result]
+
+
+def format_set_operation_result(result):
+    """ Returns the result of a set operation as a list of track dicts with their occurrences in each playlist """
+
+    return [{**track, 'occurrences': list(multiplicities)} for track, multiplicities in result]
+
+
+def convert(playlist, save_path, sync=False, delete_removed=False, resolution_cache=None, sp=None):
+    """
+    Converts the playlist with the given name to MP3 files and saves them to the given path.
+    Conversions running at the same time should share a resolution cache, so that none
+    of them overwrites the resolutions saved by the others
+    """
+
+    sp = sp or create_client()
+    return features.convert_to_mp3(sp, get_playlist_id(sp, playlist), save_path, sync, delete_removed,
+                                   resolution_cache)
@@ -0,0 +1,153 @@
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor, wait
+from functools import partial
+from time import perf_counter
+
+import api
+from constants import BATCH_WORKERS
+from playlist_index import get_playlist_ids
+from resolution_cache import ResolutionCache
+from util import get_tracks, format_duration
+
+# Job type to the function running it with the shared client and the job's options
+JOB_RUNNERS = {
+    'shuffle': lambda sp, job: api.shuffle(
+        job['main_playlist'], job.get('good_playlist'), job.get('best_playlist'), job.get('shuffle', True),
+        job.get('reorder', True), job.get('dry_run', False), sp=sp),
+    'reorder': lambda sp, job: api.reorder(
+        job['main_playlist'], job['good_playlist'], job['best_playlist'], job.get('dry_run', False), sp=sp),
+    'test': lambda sp, job: api.test(job['main_playlist'], job['good_playlist'], job['best_playlist'], sp=sp),
+    'union': lambda sp, job: api.format_set_operation_result(api.union(*job['playlists'], sp=sp)),
+    'intersection': lambda sp, job: api.format_set_operation_result(api.intersection(*job['playlists'], sp=sp)),
+    'difference': lambda sp, job: api.format_set_operation_result(api.difference(*job['playlists'], sp=sp)),
+    'symmetric_difference':
+        lambda sp, job: api.format_set_operation_result(api.symmetric_difference(*job['playlists'], sp=sp)),
+    'convert': lambda sp, job, resolution_cache=None: api.convert(
+        job['playlist'], job['save_path'], job.get('sync', False), job.get('delete_removed', False),
+        resolution_cache, sp=sp),
+}
+# Options each type of job must have. Shuffle jobs also need Good and Best, unless they don't reorder
+REQUIRED_OPTIONS = {
+    'shuffle': ('main_playlist',),
+    'reorder': ('main_playlist', 'good_playlist', 'best_playlist'),
+    'test': ('main_playlist', 'good_playlist', 'best_playlist'),
+    'union': ('playlists',),
+    'intersection': ('playlists',),
+    'difference': ('playlists',),
+    'symmetric_difference': ('playlists',),
+    'convert': ('playlist', 'save_path'),
+}
+# Options of a job which hold the names of the playlists it uses
+PLAYLIST_OPTIONS = ('main_playlist', 'good_playlist', 'best_playlist', 'playlist')
+
+
+def load_jobs(job_file_path):
+    """
+    Returns the jobs in the given JSON file, which holds a list of jobs. Every job is a dict with
+    its type (one of JOB_RUNNERS), an optional name and the options of the feature, e.g.
+    {"type": "shuffle", "main_playlist": "My Songs", "good_playlist": "Good", "best_playlist": "Best"}
+    or {"type": "union", "playlists": ["Rock", "Pop"]}
+    """
+
+    with open(job_file_path, encoding='utf-8') as job_file:
+        jobs = json.load(job_file)
+    for index, job in enumerate(jobs):
+        if job.get('type') not in JOB_RUNNERS:
+            raise ValueError(f'Job {index + 1} has unknown type {job.get("type")!r}, '
+                             f'expected one of {", ".join(JOB_RUNNERS)}')
+        missing_options = [option for option in get_required_options(job) if not job.get(option)]
+        if missing_options:
+            raise ValueError(f'Job {index + 1} is missing the options {", ".join(missing_options)}')
+        if 'playlists' in REQUIRED_OPTIONS[job['type']]:
+            api.check_set_operation_playlists(job['playlists'], f'Job {index + 1}')
+        job.setdefault('name', f'{index + 1}. {job["type"]}')
+    return jobs
+
+
+def get_required_options(job):
+    """ Returns the options the given job must have """
+
+    if job['type'] == 'shuffle' and job.get('reorder', True):
+        return REQUIRED_OPTIONS['reorder']
+    return REQUIRED_OPTIONS[job['type']]
+
+
+def run_jobs(sp, jobs, workers=BATCH_WORKERS):
+    """
+    Runs the given jobs with the given client, several at the same time. Every playlist is fetched
+    only once up front, after which the jobs read it from the client's cache. Jobs using the same
+    playlist or save path run one after another in the order of the job file, so that e.g. a test listed after
+    a shuffle checks the shuffled playlist, and no job reads a playlist while another one rewrites it.
+    Returns a list of dicts with the name, type, status, time and result (or error) of each job
+    """
+
+    playlist_ids = prefetch_playlists(sp, jobs)
+    # Conversions share the resolution cache, since every conversion saves the whole cache when it is done
+    job_runners = {**JOB_RUNNERS, 'convert': partial(JOB_RUNNERS['convert'], resolution_cache=ResolutionCache())}
+
+    def run_job(job, previous_futures):
+        # Earlier jobs were submitted first, so they are already running or done and waiting can't deadlock
+        wait(previous_futures)
+        # Timed once the jobs before it are done, so that waiting for them is not counted
+        start_time = perf_counter()
+        try:
+            result = {'status': 'ok', 'result': job_runners[job['type']](sp, job)}
+        except (Exception, SystemExit) as e:
+            result = {'status': 'failed', 'error': str(e)}
+        return {'name': job['name'], 'type': job['type'], 'seconds': perf_counter() - start_time, **result}
+
+    # Playlist ID or save path to the future of the last job submitted which uses it
+    last_futures = {}
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = []
+        for job in jobs:
+            # Conversions to the same folder share its manifest and files, so they run one after another as well
+            job_resources = {playlist_ids[name] for name in get_playlist_names(job) if name in playlist_ids}
+            if job.get('save_path'):
+                job_resources.add(os.path.abspath(job['save_path']))
+            previous_futures = {last_futures[resource] for resource in job_resources if resource in last_futures}
+            future = executor.submit(run_job, job, previous_futures)
+            last_futures.update((resource, future) for resource in job_resources)
+            futures.append(future)
+        job_results = [future.result() for future in futures]
+    print_summary(job_results)
+    return job_results
+
+
+def prefetch_playlists(sp, jobs):
+    """
+    Fetches the tracks of every distinct playlist the jobs use once, concurrently.
+    Returns a dict mapping the names of the playlists which were found to their IDs
+    """
+
+    playlist_names = list(dict.fromkeys(name for job in jobs for name in get_playlist_names(job)))
+    playlist_ids = {}
+    for playlist_name in playlist_names:
+        # Resolved one by one, so that a missing playlist only fails the jobs using it
+        try:
+            playlist_ids[playlist_name] = get_playlist_ids(sp, [playlist_name])[0]
+        except SystemExit as e:
+            print(e)
+    print(f'Fetching {len(set(playlist_ids.values()))} playlists for {len(jobs)} jobs...')
+    with ThreadPoolExecutor(max_workers=BATCH_WORKERS) as executor:
+        list(executor.map(lambda playlist_id: get_tracks(sp, playlist_id), set(playlist_ids.values())))
+    return playlist_ids
+
+
+def get_playlist_names(job):
+    """ Returns the names of all the playlists the given job uses """
+
+    return [job[option] for option in PLAYLIST_OPTIONS if job.get(option)] + list(job.get('playlists', []))
+
+
+def print_summary(job_results):
+    """ Prints a table with the status and time of every job """
+
+    name_width = max([len('Job')] + [len(job_result['name']) for job_result in job_results]) + 2
+    print(f'\n{"Job":<{name_width}}{"Type":<22}{"Status":<8}Time')
+    for job_result in job_results:
+        print(f'{job_result["name"]:<{name_width}}{job_result["type"]:<22}{job_result["status"]:<8}'
+              f'{format_duration(job_result["seconds"])}')
+        if job_result['status'] == 'failed':
+            print(f'   {job_result["error"]}')
@@ -0,0 +1,128 @@
+import argparse
+import io
+import tempfile
+import tracemalloc
+from contextlib import contextmanager, redirect_stdout
+from time import perf_counter
+
+import features
+import playlist_cache
+import util
+from fake_spotify import FakeSpotify, generate_playlists
+from spotify_client import CachingSpotify
+from track_store import TRACKS
+
+MAIN_PLAYLIST_ID = 'main'
+GOOD_PLAYLIST_ID = 'good'
+BEST_PLAYLIST_ID = 'best'
+
+# Name and function of every benchmarked feature, called with the client
+BENCHMARKS = [
+    ('get_tracks', lambda sp: util.get_tracks(sp, MAIN_PLAYLIST_ID)),
+    ('shuffle', lambda sp: features.shuffle(sp, MAIN_PLAYLIST_ID, GOOD_PLAYLIST_ID, BEST_PLAYLIST_ID, True, True)),
+    ('reorder', lambda sp: features.shuffle(sp, MAIN_PLAYLIST_ID, GOOD_PLAYLIST_ID, BEST_PLAYLIST_ID, False, True)),
+    ('check_well_ordered', lambda sp: util.check_well_ordered(sp, MAIN_PLAYLIST_ID)),
+    ('check_clones_ok', lambda sp: util.check_clones_ok(sp, MAIN_PLAYLIST_ID, GOOD_PLAYLIST_ID, BEST_PLAYLIST_ID)),
+    ('union', lambda sp: features.get_union(sp, MAIN_PLAYLIST_ID, GOOD_PLAYLIST_ID, BEST_PLAYLIST_ID)),
+    ('intersection', lambda sp: features.get_intersection(sp, MAIN_PLAYLIST_ID, GOOD_PLAYLIST_ID, BEST_PLAYLIST_ID)),
+    ('difference', lambda sp: features.get_difference(sp, MAIN_PLAYLIST_ID, GOOD_PLAYLIST_ID, BEST_PLAYLIST_ID)),
+    ('symmetric_difference',
+     lambda sp: features.get_symmetric_difference(sp, MAIN_PLAYLIST_ID, GOOD_PLAYLIST_ID, BEST_PLAYLIST_ID)),
+]
+
+
+def run_benchmarks(sizes, feature_names, clone_ratio, local_ratio, latency, rate_limit_probability, seed):
+    """
+    Runs the given features against synthetic playlists of the given sizes, on a fake Spotify client.
+    The playlists are cached in a temporary directory, so that the real playlist cache is left alone.
+    Returns a list of dicts with the wall time, API calls and peak memory of each run
+    """
+
+    results = []
+    with temporary_playlist_cache():
+        for size in sizes:
+            main_tracks, good_tracks, best_tracks = generate_playlists(size, clone_ratio, local_ratio, seed)
+            for name, benchmark in BENCHMARKS:
+                if name not in feature_names:
+                    continue
+                fake_sp = FakeSpotify(latency, rate_limit_probability, seed)
+                fake_sp.add_playlist(MAIN_PLAYLIST_ID, 'Main', main_tracks)
+                fake_sp.add_playlist(GOOD_PLAYLIST_ID, 'Good', good_tracks)
+                fake_sp.add_playlist(BEST_PLAYLIST_ID, 'Best', best_tracks)
+                # Every run starts with empty caches, as on the first run of the day
+                playlist_cache.invalidate()
+                TRACKS.clear()
+                sp = CachingSpotify(fake_sp)
+
+                with redirect_stdout(io.StringIO()):
+                    start_time = perf_counter()
+                    benchmark(sp)
+                    wall_time = perf_counter() - start_time
+                calls_count = fake_sp.get_call_count()
+                rate_limited_count = fake_sp.rate_limited_count
+
+                # Memory is measured on a separate run, since tracing slows the code down
+                playlist_cache.invalidate()
+                TRACKS.clear()
+                sp = CachingSpotify(fake_sp)
+                tracemalloc.start()
+                with redirect_stdout(io.StringIO()):
+                    benchmark(sp)
+                _, peak_memory = tracemalloc.get_traced_memory()
+                tracemalloc.stop()
+
+                results.append({
+                    'feature': name,
+                    'size': size,
+                    'wall_time': wall_time,
+                    'api_calls': calls_count,
+                    'rate_limited': rate_limited_count,
+                    'peak_memory': peak_memory,
+                })
+                print_result(results[-1])
+    return results
+
+
+@contextmanager
+def temporary_playlist_cache():
+    """ Caches the playlists in a temporary directory during the with block """
+
+    playlist_cache_dir = playlist_cache.PLAYLIST_CACHE_DIR
+    with tempfile.TemporaryDirectory() as temporary_cache_dir:
+        playlist_cache.PLAYLIST_CACHE_DIR = temporary_cache_dir
+        try:
+            yield
+        finally:
+            playlist_cache.PLAYLIST_CACHE_DIR = playlist_cache_dir
+
+
+def print_result(result):
+    """ Prints a row of the results table """
+
+    print(f'{result["feature"]:<22}{result["size"]:>8}{result["wall_time"]:>12.3f}{result["api_calls"]:>11}'
+          f'{result["rate_limited"]:>14}{result["peak_memory"] / 1024 / 1024:>18.1f}')
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmarks the features against a fake Spotify client')
+    parser.add_argument('--sizes', nargs='+', type=int, default=[1000, 10000, 100000],
+                        help='Sizes of the main playlist')
+    parser.add_argument('--features', nargs='+', choices=[name for name, _ in BENCHMARKS],
+                        default=[name for name, _ in BENCHMARKS], help='Features to benchmark')
+    parser.add_argument('--clone_ratio', type=float, default=0.2,
+                        help='Fraction of the main playlist which are clones')
+    parser.add_argument('--local_ratio', type=float, default=0.0, help='Fraction of the tracks which are local')
+    parser.add_argument('--latency', type=float, default=0.0, help='Seconds every API call takes')
+    parser.add_argument('--rate_limit_probability', type=float, default=0.0,
+                        help='Probability of an API call being rate limited')
+    parser.add_argument('--seed', type=int, default=0, help='Seed for the synthetic playlists')
+    args = parser.parse_args()
+
+    print(f'{"Feature":<22}{"Size":>8}{"Time (s)":>12}{"API calls":>11}{"Rate limited":>14}'
+          f'{"Peak memory (MB)":>18}')
+    run_benchmarks(args.sizes, args.features, args.clone_ratio, args.local_ratio, args.latency,
+                   args.rate_limit_probability, args.seed)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,52 @@
+import argparse
+import json
+import sys
+from contextlib import redirect_stdout
+
+from main import add_arguments, run
+
+
+class HeadlessArgumentParser(argparse.ArgumentParser):
+    """
+    Argument parser which ignores the GUI-only options, so that the options of the GUI can be reused.
+    The GUI options stored as False when passed, e.g. --shuffle, turn their feature on, so without
+    them nothing would run. Here they are --no_shuffle etc. instead, and their features run unless turned off
+    """
+
+    def add_argument_group(self, *args, **kwargs):
+        group = super().add_argument_group(*args, **kwargs)
+        add_argument = group.add_argument
+
+        def add_headless_argument(*argument_args, widget=None, gooey_options=None, **argument_kwargs):
+            if argument_kwargs.get('action') == 'store_false':
+                option_name = argument_args[0].lstrip('-')
+                help_text = argument_kwargs['help'].strip()
+                argument_args = (f'--no_{option_name}',)
+                # Stored the other way around, since the features read these options inverted
+                argument_kwargs = {**argument_kwargs, 'action': 'store_true', 'default': False, 'dest': option_name,
+                                   'help': f"Don't {help_text[0].lower()}{help_text[1:]}"}
+            return add_argument(*argument_args, **argument_kwargs)
+
+        group.add_argument = add_headless_argument
+        return group
+
+
+def main():
+    """ Runs the features without the GUI, e.g. from cron jobs or on servers """
+
+    parser = HeadlessArgumentParser(description='Spotify utilities')
+    add_arguments(parser)
+    parser.add_argument('--json', action='store_true',
+                        help='Print the results as JSON. Everything else is printed to stderr')
+    args = parser.parse_args()
+
+    if args.json:
+        with redirect_stdout(sys.stderr):
+            results = run(args)
+        print(json.dumps(results, indent=2, ensure_ascii=False))
+    else:
+        run(args)
+
+
+if __name__ == '__main__':
+    main()
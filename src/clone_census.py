@@ -0,0 +1,74 @@
+from collections import defaultdict
+
+from track_store import TRACKS
+
+
+def get_clone_positions(tracks):
+    """ Returns a dict mapping each track ID to the list of its positions in the given track IDs """
+
+    positions = defaultdict(list)
+    for index, track in enumerate(tracks):
+        positions[track].append(index)
+    return positions
+
+
+def check_clone_playlists(tracks, clone_playlists):
+    """
+    Compares the clones in the given track IDs with the playlists which should hold the
+    tracks occurring a given number of times, e.g. {2: Good tracks, 3: Best tracks}.
+    Every playlist is only iterated once, so the check takes linear time and the
+    track IDs can be streamed.
+    Returns a dict with:
+    - missing: tuples of the form (track ID, occurrences) for tracks missing from the playlist for their occurrences
+    - extra: tuples of the form (track ID, expected occurrences) for tracks of a playlist which are not in the tracks
+    - wrong_multiplicity: tuples of the form (track ID, occurrences, expected occurrences) for tracks of a playlist
+      occurring another number of times, and for tracks occurring more often than any playlist is for (expected None)
+    """
+
+    positions = get_clone_positions(tracks)
+    report = {'missing': [], 'extra': [], 'wrong_multiplicity': []}
+    playlist_tracks = {}
+    for clones_count, clone_playlist in clone_playlists.items():
+        playlist_tracks[clones_count] = set(clone_playlist)
+        for track in dict.fromkeys(clone_playlist):
+            occurrences = len(positions.get(track, ()))
+            if not occurrences:
+                report['extra'].append((track, clones_count))
+            elif occurrences != clones_count:
+                report['wrong_multiplicity'].append((track, occurrences, clones_count))
+
+    max_clones_count = max(clone_playlists, default=1)
+    for track, track_positions in positions.items():
+        # Tracks of a playlist were checked against it above
+        if any(track in tracks for tracks in playlist_tracks.values()):
+            continue
+        occurrences = len(track_positions)
+        if occurrences in playlist_tracks:
+            report['missing'].append((track, occurrences))
+        elif occurrences > max_clones_count:
+            report['wrong_multiplicity'].append((track, occurrences, None))
+    return report
+
+
+def print_report(report, playlist_labels):
+    """ Prints the problems found by check_clone_playlists. Labels name the playlist for each number of clones """
+
+    for track, occurrences in report['missing']:
+        print(f'(!) "{TRACKS.get_name(track)}" is present {format_times(occurrences)} in the main playlist, '
+              f'but not present in the {playlist_labels[occurrences]} playlist.')
+    for track, clones_count in report['extra']:
+        print(f'(!) "{TRACKS.get_name(track)}" should be present {format_times(clones_count)}, '
+              f'but it is not present in the main playlist.')
+    for track, occurrences, clones_count in report['wrong_multiplicity']:
+        if clones_count is None:
+            print(f'(!) "{TRACKS.get_name(track)}" is present {format_times(occurrences)} in the main playlist, '
+                  f'but no playlist is meant for that many clones.')
+        else:
+            print(f'(!) "{TRACKS.get_name(track)}" should be present {format_times(clones_count)}, '
+                  f'but it is present {format_times(occurrences)}.')
+
+
+def format_times(count):
+    """ Returns how many times something occurs in words, e.g. twice """
+
+    return {1: 'once', 2: 'twice', 3: 'three times'}.get(count, f'{count} times')
@@ -1,3 +1,5 @@
+import os
+
 USER_ID = '11170957184'
 # Low and high in order to choose a random minimal distance between
 # the two values for every track
@@ -6,5 +8,35 @@ HIGH_MIN_DISTANCE_TWO_CLONES_AS_FRACTION = 1 / 3
 LOW_MIN_DISTANCE_THREE_CLONES_AS_FRACTION = 1 / 5
 HIGH_MIN_DISTANCE_THREE_CLONES_AS_FRACTION = 1 / 4
 # Smaller min distance to test with, to account for possible deviations
-# from the min distance, due to reordering of other tracks
+# from the min distance, due to local tracks being placed in between
 TEST_MIN_DISTANCE = 1 / 6
+# Playlists holding the tracks which occur the given number of times in the main playlist
+CLONE_PLAYLIST_LABELS = {2: 'good', 3: 'best'}
+# Maximal number of items the Spotify API returns per page
+PAGE_SIZE = 100
+# Maximal number of playlist pages fetched at the same time
+MAX_CONCURRENT_REQUESTS = 8
+# How many times a request is retried when rate limited by Spotify
+MAX_RATE_LIMIT_RETRIES = 5
+# Server errors the HTTP session retries by itself. Rate limits (429) are left to call_with_backoff
+SPOTIFY_RETRY_STATUS_CODES = (500, 502, 503, 504)
+# Directory for data kept between runs
+CACHE_DIR = os.path.join(os.path.expanduser('~'), '.cache', 'spotify-utils')
+# Maximal total size of the cached playlists, the least recently used ones are evicted first
+MAX_PLAYLIST_CACHE_SIZE_BYTES = 50 * 1024 * 1024
+# Maximal number of YouTube searches made at the same time
+RESOLVE_WORKERS = 8
+# Maximal number of tracks downloaded at the same time
+DOWNLOAD_WORKERS = 4
+# Maximal number of tracks converted to MP3 at the same time
+TRANSCODE_WORKERS = os.cpu_count() or 1
+# How long not finding a track on YouTube is remembered, before searching for it again
+NEGATIVE_RESOLUTION_TTL_SECONDS = 7 * 24 * 3600
+# Maximal number of playlists the Spotify API returns per page
+PLAYLISTS_PAGE_SIZE = 50
+# How long the cached playlist names are used, before fetching them again
+PLAYLIST_INDEX_TTL_SECONDS = 3600
+# Number of batch jobs which run at the same time
+BATCH_WORKERS = 4
+# Spotify API calls per second all batch jobs together may make
+BATCH_CALLS_PER_SECOND = 10
@@ -0,0 +1,206 @@
+import os
+import subprocess
+import threading
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, wait, FIRST_COMPLETED
+from queue import Queue, Empty
+from time import time
+
+from constants import RESOLVE_WORKERS, DOWNLOAD_WORKERS, TRANSCODE_WORKERS
+from profiling import PROFILER, run_timed
+from resolution_cache import ResolutionCache
+from util import get_youtube_search_url, format_duration, CustomLogger
+from youtube_resolver import YoutubeResolver, get_video_url
+
+# Stages every track goes through, each one on its own pool
+RESOLVE = 'resolve'
+DOWNLOAD = 'download'
+TRANSCODE = 'transcode'
+
+# How often the pipeline checks for new tracks while they are still being yielded
+FEED_INTERVAL_SECONDS = 0.1
+
+# Every download thread keeps its own YoutubeDL instance
+thread_data = threading.local()
+
+
+def convert_tracks(tracks, save_path, resolver=None, resolution_cache=None):
+    """
+    Converts the given tracks to MP3 files and saves them to the given path.
+    Tracks are resolved to YouTube URLs (by the given resolver or a new one,
+    through the given or the persistent resolution cache), downloaded and
+    transcoded in a pipeline, so a track moves to the next stage as soon
+    as it is done with the previous one. The tracks can be a generator, e.g.
+    of a playlist still loading, and are resolved as soon as they are yielded.
+    If yielding them fails, the tracks already in the pipeline are still converted
+    and an InterruptedConversion with their results is raised.
+    Returns a tuple of the form (converted, not downloaded), where converted holds
+    tuples of the form (track, YouTube URL, MP3 file path)
+    """
+
+    resolver = resolver or YoutubeResolver()
+    resolution_cache = resolution_cache or ResolutionCache()
+    progress = ConversionProgress()
+    converted_tracks = []
+    tracks_not_downloaded = []
+    track_queue = Queue()
+    feeder = threading.Thread(target=feed_tracks, args=(tracks, track_queue), daemon=True)
+    feeder.start()
+    is_feeding = True
+    feed_error = None
+    try:
+        with ThreadPoolExecutor(max_workers=RESOLVE_WORKERS) as resolve_executor, \
+                ThreadPoolExecutor(max_workers=DOWNLOAD_WORKERS) as download_executor, \
+                ProcessPoolExecutor(max_workers=TRANSCODE_WORKERS) as transcode_executor:
+            pending = {}
+            while is_feeding or pending:
+                # Takes the tracks which arrived meanwhile, waiting for the next one if nothing else is pending
+                while is_feeding:
+                    try:
+                        track = track_queue.get(block=not pending)
+                    except Empty:
+                        break
+                    if isinstance(track, FeedEnd):
+                        is_feeding = False
+                        # The tracks already yielded are still converted, so that their results can be kept
+                        feed_error = track.error
+                        break
+                    pending[resolve_executor.submit(resolve_track_url, resolver, resolution_cache, track)] = \
+                        (RESOLVE, track, None)
+                    progress.add_track()
+                if not pending:
+                    continue
+
+                done, _ = wait(pending, timeout=FEED_INTERVAL_SECONDS if is_feeding else None,
+                               return_when=FIRST_COMPLETED)
+                for future in done:
+                    stage, track, url = pending.pop(future)
+                    try:
+                        result = future.result()
+                    except Exception:
+                        result = None
+                    if not result:
+                        tracks_not_downloaded.append(track)
+                        progress.finish_track(failed=True)
+                    elif stage == RESOLVE:
+                        pending[download_executor.submit(download_audio, result, save_path)] = (DOWNLOAD, track, result)
+                        progress.finish_stage(RESOLVE)
+                    elif stage == DOWNLOAD:
+                        # Timed in the transcoding process, since spans there don't reach this process
+                        transcoding = transcode_executor.submit(run_timed, transcode_to_mp3, result)
+                        pending[transcoding] = (TRANSCODE, track, url)
+                        progress.finish_stage(DOWNLOAD)
+                    else:
+                        mp3_path, start_time, duration, process_id = result
+                        PROFILER.add_span(TRANSCODE, start_time, duration, process_id)
+                        converted_tracks.append((track, url, mp3_path))
+                        progress.finish_track()
+    finally:
+        resolution_cache.save()
+    if feed_error:
+        raise InterruptedConversion(feed_error, converted_tracks, tracks_not_downloaded)
+    return converted_tracks, tracks_not_downloaded
+
+
+class InterruptedConversion(Exception):
+    """ Raised when the tracks to convert could not all be yielded, with the results of the ones which were """
+
+    def __init__(self, error, converted_tracks, tracks_not_downloaded):
+        super().__init__(str(error))
+        self.error = error
+        self.converted_tracks = converted_tracks
+        self.tracks_not_downloaded = tracks_not_downloaded
+
+
+class FeedEnd:
+    """ Put in the queue after the last track, with the error which ended the tracks early, if any """
+
+    def __init__(self, error=None):
+        self.error = error
+
+
+def feed_tracks(tracks, track_queue):
+    """ Puts the given tracks in the queue one by one, followed by a FeedEnd """
+
+    try:
+        for track in tracks:
+            track_queue.put(track)
+    except BaseException as e:
+        track_queue.put(FeedEnd(e))
+    else:
+        track_queue.put(FeedEnd())
+
+
+def resolve_track_url(resolver, resolution_cache, track):
+    """
+    Returns the URL of the track's first matching YouTube search result,
+    or None if there is none. Tracks resolved before are not searched again.
+    A failed search raises and is not cached, only a search without a matching result is
+    """
+
+    found, video_id = resolution_cache.get(track)
+    PROFILER.count('resolution_cache_hits' if found else 'resolution_cache_misses')
+    if not found:
+        with PROFILER.span(RESOLVE):
+            youtube_search_url = get_youtube_search_url(artist_name=track['artist'], track_name=track['name'])
+            video_id = resolver.get_first_result_video_id(youtube_search_url, track['name'])
+        resolution_cache.put(track, video_id)
+    return get_video_url(video_id) if video_id else None
+
+
+def download_audio(url, save_path):
+    """ Downloads the best audio of the given YouTube video to the given location and returns the file path """
+
+    if not hasattr(thread_data, 'ydl'):
+        # Imported only when downloading, since it is slow to import
+        import yt_dlp
+        thread_data.ydl = yt_dlp.YoutubeDL({
+            'outtmpl': f'{save_path}/%(title)s.%(ext)s',
+            'format': 'bestaudio/best',
+            "logger": CustomLogger,
+        })
+    with PROFILER.span(DOWNLOAD):
+        info = thread_data.ydl.extract_info(url, download=True)
+    file_path = thread_data.ydl.prepare_filename(info)
+    PROFILER.count('bytes_downloaded', os.path.getsize(file_path))
+    return file_path
+
+
+def transcode_to_mp3(source_path):
+    """ Converts the given audio file to an MP3 file next to it, deletes the original and returns the new path """
+
+    mp3_path = f'{os.path.splitext(source_path)[0]}.mp3'
+    subprocess.run(['ffmpeg', '-y', '-loglevel', 'error', '-i', source_path, '-vn', '-codec:a', 'libmp3lame',
+                    '-b:a', '192k', mp3_path], check=True)
+    if source_path != mp3_path:
+        os.remove(source_path)
+    return mp3_path
+
+
+class ConversionProgress:
+    """ Prints how many tracks went through each stage, the throughput and the estimated time left """
+
+    def __init__(self):
+        self.tracks_count = 0
+        self.start_time = time()
+        self.stage_counts = {RESOLVE: 0, DOWNLOAD: 0}
+        self.finished_count = 0
+        self.failed_count = 0
+
+    def add_track(self):
+        """ Counts a track which is to be converted. The total grows while the tracks are still being yielded """
+
+        self.tracks_count += 1
+
+    def finish_stage(self, stage):
+        self.stage_counts[stage] += 1
+
+    def finish_track(self, failed=False):
+        self.finished_count += 1
+        if failed:
+            self.failed_count += 1
+        elapsed_time = time() - self.start_time
+        throughput = self.finished_count / elapsed_time if elapsed_time else 0
+        remaining_time = (self.tracks_count - self.finished_count) / throughput if throughput else 0
+        print(f'{self.finished_count}/{self.tracks_count} tracks done ({self.failed_count} failed, '
+              f'{self.stage_counts[RESOLVE]} resolved, {self.stage_counts[DOWNLOAD]} downloaded) - '
+              f'{round(throughput * 60, 1)} tracks/minute, ETA {format_duration(remaining_time)}')
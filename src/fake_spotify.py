@@ -0,0 +1,223 @@
+import random
+from collections import Counter
+from threading import RLock
+from time import sleep
+
+from spotipy import SpotifyException
+
+from constants import USER_ID, PAGE_SIZE, PLAYLISTS_PAGE_SIZE
+
+
+class FakeSpotify:
+    """
+    In-memory stand-in for spotipy.Spotify, implementing the calls the features use, with the
+    rules of the real API: page and item limits of 100 (50 for playlists), snapshot IDs changing
+    on every write, stale snapshots being rejected and local tracks not being addable.
+    Every call can be delayed and randomly rate limited, and the calls are counted
+    """
+
+    def __init__(self, latency=0.0, rate_limit_probability=0.0, seed=None):
+        self.latency = latency
+        self.rate_limit_probability = rate_limit_probability
+        self.random = random.Random(seed)
+        # Playlist ID to a dict with its name, items, URIs removed since the items were last used and snapshot number
+        self.playlists = {}
+        # URI to track, for every track in any playlist
+        self.catalog = {}
+        self.call_counts = Counter()
+        self.rate_limited_count = 0
+        self.lock = RLock()
+
+    def add_playlist(self, playlist_id, name, tracks):
+        """ Adds a playlist with the given tracks, as returned by get_tracks """
+
+        items = [{'track': {
+            'id': track['id'],
+            'uri': track['uri'],
+            'name': track['name'],
+            'artists': [{'name': track['artist']}],
+            'is_local': track['is_local'],
+        }} for track in tracks]
+        self.catalog.update((item['track']['uri'], item) for item in items)
+        self.playlists[playlist_id] = {'name': name, 'items': items, 'removed_uris': set(), 'snapshot': 0}
+
+    def playlist(self, playlist_id, fields=None, market=None, additional_types=('track',)):
+        playlist = self.start_call('playlist', playlist_id)
+        return {
+            'id': playlist_id,
+            'name': playlist['name'],
+            'snapshot_id': get_snapshot_id(playlist),
+            'tracks': {'total': len(self.get_items(playlist))},
+        }
+
+    def playlist_items(self, playlist_id, fields=None, limit=PAGE_SIZE, offset=0, market=None,
+                       additional_types=('track', 'episode')):
+        playlist = self.start_call('playlist_items', playlist_id)
+        check_limit(limit, PAGE_SIZE)
+        return get_page(self.get_items(playlist), limit, offset)
+
+    def user_playlists(self, user, limit=PLAYLISTS_PAGE_SIZE, offset=0):
+        self.start_call('user_playlists')
+        check_limit(limit, PLAYLISTS_PAGE_SIZE)
+        playlists = [{'id': playlist_id, 'name': playlist['name'], 'owner': {'id': USER_ID}}
+                     for playlist_id, playlist in self.playlists.items()]
+        return get_page(playlists, limit, offset)
+
+    def playlist_add_items(self, playlist_id, items, position=None):
+        playlist = self.start_call('playlist_add_items', playlist_id)
+        new_items = self.get_catalog_items(items)
+        with self.lock:
+            items = self.get_items(playlist)
+            if position is None:
+                items.extend(new_items)
+            else:
+                items[position:position] = new_items
+            return self.change(playlist)
+
+    def playlist_replace_items(self, playlist_id, items):
+        playlist = self.start_call('playlist_replace_items', playlist_id)
+        new_items = self.get_catalog_items(items)
+        with self.lock:
+            playlist['items'] = new_items
+            playlist['removed_uris'].clear()
+            return self.change(playlist)
+
+    def playlist_remove_all_occurrences_of_items(self, playlist_id, items, snapshot_id=None):
+        playlist = self.start_call('playlist_remove_all_occurrences_of_items', playlist_id)
+        check_limit(len(items), PAGE_SIZE)
+        uris = {get_uri(item) for item in items}
+        with self.lock:
+            check_snapshot(playlist, snapshot_id)
+            # Applied when the items are next used, so that removing a large playlist in batches of
+            # 100 costs one pass over it, rather than one per batch, which would skew the benchmarks
+            playlist['removed_uris'].update(uris)
+            return self.change(playlist)
+
+    def playlist_reorder_items(self, playlist_id, range_start, insert_before, range_length=1, snapshot_id=None):
+        playlist = self.start_call('playlist_reorder_items', playlist_id)
+        with self.lock:
+            check_snapshot(playlist, snapshot_id)
+            items = self.get_items(playlist)
+            if range_start < 0 or range_start + range_length > len(items) or not 0 <= insert_before <= len(items):
+                raise SpotifyException(400, -1, 'Invalid range')
+            moved_items = items[range_start:range_start + range_length]
+            del items[range_start:range_start + range_length]
+            insert_at = insert_before if insert_before < range_start else max(range_start, insert_before - range_length)
+            items[insert_at:insert_at] = moved_items
+            return self.change(playlist)
+
+    def start_call(self, method_name, playlist_id=None):
+        """ Counts the call, waits the latency, may rate limit it and returns the playlist it is about """
+
+        with self.lock:
+            self.call_counts[method_name] += 1
+        if self.latency:
+            sleep(self.latency)
+        if self.random.random() < self.rate_limit_probability:
+            with self.lock:
+                self.rate_limited_count += 1
+            raise SpotifyException(429, -1, 'API rate limit exceeded', headers={'Retry-After': '0'})
+        if playlist_id is None:
+            return None
+        if playlist_id not in self.playlists:
+            raise SpotifyException(404, -1, 'Not found.')
+        return self.playlists[playlist_id]
+
+    def get_items(self, playlist):
+        """ Returns the items of the playlist, without the tracks removed from it """
+
+        with self.lock:
+            if playlist['removed_uris']:
+                removed_uris = playlist['removed_uris']
+                playlist['items'] = [item for item in playlist['items'] if item['track']['uri'] not in removed_uris]
+                removed_uris.clear()
+            return playlist['items']
+
+    def get_catalog_items(self, items):
+        """ Returns the playlist items of the given track IDs or URIs, which must not be local """
+
+        check_limit(len(items), PAGE_SIZE)
+        uris = [get_uri(item) for item in items]
+        if any(uri not in self.catalog or self.catalog[uri]['track']['is_local'] for uri in uris):
+            raise SpotifyException(400, -1, 'Payload contains a non-existing ID')
+        return [self.catalog[uri] for uri in uris]
+
+    @staticmethod
+    def change(playlist):
+        """ Gives the playlist a new snapshot after a write and returns it, as the API does """
+
+        playlist['snapshot'] += 1
+        return {'snapshot_id': get_snapshot_id(playlist)}
+
+    def get_call_count(self):
+        """ Returns the number of calls made, including the rate limited ones """
+
+        return sum(self.call_counts.values())
+
+
+def get_snapshot_id(playlist):
+    """ Returns the snapshot ID of the current version of the playlist """
+
+    return f'snapshot-{playlist["snapshot"]}'
+
+
+def check_snapshot(playlist, snapshot_id):
+    """ Rejects writes made against an outdated version of the playlist """
+
+    if snapshot_id is not None and snapshot_id != get_snapshot_id(playlist):
+        raise SpotifyException(400, -1, 'Snapshot is out of date')
+
+
+def check_limit(count, limit):
+    """ Rejects requests for more items than the API allows at once """
+
+    if count > limit:
+        raise SpotifyException(400, -1, f'Invalid limit, maximum is {limit}')
+
+
+def get_uri(item):
+    """ Returns the URI of a track given by ID or URI """
+
+    return item if item.startswith('spotify:') else f'spotify:track:{item}'
+
+
+def get_page(items, limit, offset):
+    """ Returns a page of the given items in the format of the API """
+
+    return {
+        'items': items[offset:offset + limit],
+        'total': len(items),
+        'limit': limit,
+        'offset': offset,
+        'next': 'next' if offset + limit < len(items) else None,
+    }
+
+
+def generate_playlists(size, clone_ratio, local_ratio=0.0, seed=None):
+    """
+    Returns a tuple of the form (main, good, best) of synthetic playlists. Of the tracks in
+    the main playlist, about clone_ratio are clones, two thirds of them present twice (and in
+    Good) and one third three times (and in Best). About local_ratio of the tracks are local
+    """
+
+    generator = random.Random(seed)
+    clone_occurrences = round(size * clone_ratio)
+    best_count = clone_occurrences // 3 // 3
+    good_count = (clone_occurrences - 3 * best_count) // 2
+    single_count = size - 2 * good_count - 3 * best_count
+
+    def create_track(number):
+        if generator.random() < local_ratio:
+            return {'id': None, 'uri': f'spotify:local:Artist+{number}::Track+{number}:200',
+                    'name': f'Local track {number}', 'artist': f'Artist {number}', 'is_local': True}
+        track_id = f'{number:022d}'
+        return {'id': track_id, 'uri': f'spotify:track:{track_id}', 'name': f'Track {number}',
+                'artist': f'Artist {number}', 'is_local': False}
+
+    good_tracks = [create_track(number) for number in range(good_count)]
+    best_tracks = [create_track(number) for number in range(good_count, good_count + best_count)]
+    single_tracks = [create_track(number) for number in
+                     range(good_count + best_count, good_count + best_count + single_count)]
+    main_tracks = single_tracks + good_tracks * 2 + best_tracks * 3
+    generator.shuffle(main_tracks)
+    return main_tracks, good_tracks, best_tracks
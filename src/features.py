@@ -1,19 +1,23 @@
 import random
-import re
-from random import randint
 
-import math
-import requests
-import yt_dlp
+import manifest
+import set_operations
+from clone_census import check_clone_playlists, print_report
+from constants import CLONE_PLAYLIST_LABELS
+from conversion import convert_tracks, InterruptedConversion
+from ordering import schedule_clones, place_local_tracks
+from playlist_writer import plan_rewrite, count_naive_rewrite_calls, apply_plan, describe_plan
+from profiling import PROFILER
+from track_store import TRACKS
+from util import get_tracks, iter_tracks, call_with_backoff
 
-from constants import LOW_MIN_DISTANCE_TWO_CLONES_AS_FRACTION, HIGH_MIN_DISTANCE_TWO_CLONES_AS_FRACTION, \
-    LOW_MIN_DISTANCE_THREE_CLONES_AS_FRACTION, HIGH_MIN_DISTANCE_THREE_CLONES_AS_FRACTION
-from util import get_tracks, divide_in_chunks, get_youtube_search_url, get_last_occurrence_index, get_track_name_core, \
-    CustomLogger
 
-
-def shuffle(sp, main_playlist_id, good_playlist_id, best_playlist_id, should_shuffle, should_reorder):
-    """ Shuffles the tracks of the given playlist, keeping clones of a track apart """
+def shuffle(sp, main_playlist_id, good_playlist_id, best_playlist_id, should_shuffle, should_reorder, dry_run=False):
+    """
+    Shuffles the tracks of the given playlist, keeping clones of a track apart.
+    On a dry run, only prints how many API calls the changes would take.
+    Returns a dict with the number of API calls made (or planned) and saved
+    """
 
     if should_shuffle and should_reorder:
         print('Started shuffle and reordering...')
@@ -23,224 +27,197 @@ def shuffle(sp, main_playlist_id, good_playlist_id, best_playlist_id, should_shu
         print('Started reordering...')
 
     tracks = get_tracks(sp, main_playlist_id)
-    main_playlist_size = len(tracks)
-    non_local_tracks = [track for track in tracks if not track['is_local']]
+    non_local_tracks = [track for track in tracks if not TRACKS.is_local(track)]
     if should_shuffle:
-        random.shuffle(non_local_tracks)
+        with PROFILER.span('shuffle'):
+            random.shuffle(non_local_tracks)
     if should_reorder:
-        non_local_tracks = reorder(sp, non_local_tracks, good_playlist_id, best_playlist_id)
-    non_local_tracks_ids = [track['id'] for track in non_local_tracks]
-    # A maximum of 100 tracks can be deleted/added at once
-    for chunk in divide_in_chunks(non_local_tracks_ids, 100):
-        sp.playlist_remove_all_occurrences_of_items(main_playlist_id, chunk)
-    try:
-        reordered_non_local_track_ids = [track['id'] for track in non_local_tracks]
-        for chunk in divide_in_chunks(reordered_non_local_track_ids, 100):
-            sp.playlist_add_items(main_playlist_id, chunk)
-    except:
-        for chunk in divide_in_chunks(non_local_tracks_ids, 100):
-            sp.playlist_add_items(main_playlist_id, chunk)
-    local_tracks = [track for track in tracks if track['is_local']]
-    # Minimal distance between any two clones of the same local track
-    min_distance = math.floor(main_playlist_size * HIGH_MIN_DISTANCE_THREE_CLONES_AS_FRACTION)
-    reordered_local_tracks = {}
-    for track in local_tracks:
-        if track['uri'] in reordered_local_tracks:
-            new_index = (reordered_local_tracks[track['uri']] + min_distance) % main_playlist_size
-        else:
-            new_index = random.randint(1, main_playlist_size)
-        sp.playlist_reorder_items(main_playlist_id, range_start=0, insert_before=new_index)
-        reordered_local_tracks[track['uri']] = new_index
+        with PROFILER.span('reorder'):
+            non_local_tracks = reorder(sp, non_local_tracks, good_playlist_id, best_playlist_id)
+    local_tracks = [track for track in tracks if TRACKS.is_local(track)]
+    with PROFILER.span('local placement'):
+        target_tracks = place_local_tracks(non_local_tracks, local_tracks)
+    with PROFILER.span('plan'):
+        plan = plan_rewrite(tracks, target_tracks)
+    saved_calls_count = count_naive_rewrite_calls(tracks, target_tracks) - len(plan)
+    result = {'api_calls': len(plan), 'saved_api_calls': saved_calls_count, 'dry_run': dry_run}
+    if dry_run:
+        print(f'Dry run, planned {describe_plan(plan)}, saving {saved_calls_count} API calls')
+        return result
+    with PROFILER.span('write'):
+        snapshot_id = call_with_backoff(sp.playlist, main_playlist_id, fields='snapshot_id')['snapshot_id']
+        apply_plan(sp, main_playlist_id, plan, snapshot_id)
+    print(f'Made {describe_plan(plan)}, saving {saved_calls_count} API calls')
 
     print('Done')
+    return result
 
 
 def reorder(sp, tracks, good_playlist_id, best_playlist_id):
     """
     Reorders the given tracks so that the ones that appear
-    two or three times (clones) are not too close to each other
+    more than once (clones) are not too close to each other
     """
 
-    tracks_count = len(tracks)
-    reordered_tracks = tracks
-
-    # Reorder tracks with 2 clones
-    for good_track in get_tracks(sp, good_playlist_id):
-        if good_track['is_local']:
-            continue
-        # Minimal distance between two clones of the same track
-        min_distance = randint(
-            math.floor(tracks_count * LOW_MIN_DISTANCE_TWO_CLONES_AS_FRACTION),
-            math.floor(tracks_count * HIGH_MIN_DISTANCE_TWO_CLONES_AS_FRACTION))
-        clone_indices = [index for index, track in enumerate(reordered_tracks) if track['id'] == good_track['id']]
-        if len(clone_indices) != 2:
-            good_track_name = good_track['name']
-            print(f'(!) "{good_track_name}" should be present twice, but it is not.')
-            continue
-        if clone_indices[1] - clone_indices[0] < min_distance:
-            new_index = (clone_indices[0] + min_distance) % tracks_count
-            reordered_tracks.insert(new_index, reordered_tracks.pop(clone_indices[1]))
-
-    # Reorder tracks with 3 clones
-    for best_track in get_tracks(sp, best_playlist_id):
-        if best_track['is_local']:
-            continue
-        # Minimal distance between any two clones of the same track
-        min_distance = randint(
-            math.floor(tracks_count * LOW_MIN_DISTANCE_THREE_CLONES_AS_FRACTION),
-            math.floor(tracks_count * HIGH_MIN_DISTANCE_THREE_CLONES_AS_FRACTION))
-        clone_indices = [index for index, track in enumerate(reordered_tracks) if track['id'] == best_track['id']]
-        if len(clone_indices) != 3:
-            best_track_name = best_track['name']
-            print(f'(!) "{best_track_name}" should be present three times, but it is not.')
-            continue
-        if clone_indices[1] - clone_indices[0] < min_distance:
-            new_index = (clone_indices[0] + min_distance) % tracks_count
-            reordered_tracks.insert(new_index, reordered_tracks.pop(clone_indices[1]))
-            if clone_indices[1] < clone_indices[2] < new_index:
-                # Third clone has shifted, due to moving the second one
-                clone_indices[2] -= 1
-            if abs(clone_indices[2] - new_index) < min_distance:
-                # Third clone is being moved to the beginning of the list,
-                # make sure it's not too close to the first clone
-                reordered_tracks.insert((new_index + min_distance) % tracks_count,
-                                        reordered_tracks.pop(clone_indices[2]))
-        elif clone_indices[2] - clone_indices[1] < min_distance:
-            new_index = (clone_indices[1] + min_distance) % tracks_count
-            if abs(clone_indices[0] - new_index) < min_distance:
-                new_index = (clone_indices[0] + min_distance) % tracks_count
-            reordered_tracks.insert(new_index, reordered_tracks.pop(clone_indices[2]))
-
-    return reordered_tracks
-
-
-def get_intersection(sp, playlist1_id, playlist2_id):
+    # Local tracks are placed separately, so they are not checked here
+    report = check_clone_playlists(tracks, {
+        2: [track for track in get_tracks(sp, good_playlist_id) if not TRACKS.is_local(track)],
+        3: [track for track in get_tracks(sp, best_playlist_id) if not TRACKS.is_local(track)],
+    })
+    print_report(report, CLONE_PLAYLIST_LABELS)
+
+    return schedule_clones(tracks)
+
+
+def get_union(sp, *playlist_ids):
     """
-    Returns a tuple of the form (id, name) of all
-    the tracks present in both playlists
+    Returns a list of tuples of the form (track ID, multiplicities)
+    of all the tracks present in any of the playlists
     """
 
-    playlist1_name = sp.playlist(playlist1_id, fields='name')['name']
-    playlist2_name = sp.playlist(playlist2_id, fields='name')['name']
-    playlist1_tracks = get_tracks(sp, playlist1_id)
-    playlist2_tracks = get_tracks(sp, playlist2_id)
-    smaller_playlist = playlist1_tracks if len(playlist1_tracks) < len(playlist2_tracks) else playlist2_tracks
-    larger_playlist = playlist1_tracks if len(playlist1_tracks) >= len(playlist2_tracks) else playlist2_tracks
+    playlist_names, playlists = get_playlists(sp, playlist_ids)
+    union = set_operations.union(*playlists)
+    print_set_operation_result(union, f'Union of playlists {format_playlist_names(playlist_names)}:',
+                               'All playlists are empty')
+    return union
 
-    intersection = [track for track in smaller_playlist if track in larger_playlist]
 
-    if intersection:
-        print(f'Intersection of playlists "{playlist1_name}" and "{playlist2_name}":')
-        [print(f'   {track["name"]}') for track in intersection]
-    else:
-        print(f'Playlists "{playlist1_name}" and "{playlist2_name}" have no tracks in common')
+def get_intersection(sp, *playlist_ids):
+    """
+    Returns a list of tuples of the form (track ID, multiplicities)
+    of all the tracks present in all the playlists
+    """
 
+    playlist_names, playlists = get_playlists(sp, playlist_ids)
+    intersection = set_operations.intersection(*playlists)
+    print_set_operation_result(intersection,
+                               f'Intersection of playlists {format_playlist_names(playlist_names)}:',
+                               f'Playlists {format_playlist_names(playlist_names)} have no tracks in common')
     return intersection
 
 
-def get_difference(sp, base_playlist_id, playlist2_id):
+def get_difference(sp, base_playlist_id, *playlist_ids):
     """
-    Returns a tuple of the form (id, name) of all the tracks present
-    in the first playlist but missing from the second one
+    Returns a list of tuples of the form (track ID, multiplicities) of all the tracks
+    present in the first playlist but missing from all the other ones
     """
 
-    base_playlist_name = sp.playlist(base_playlist_id, fields='name')['name']
-    playlist2_name = sp.playlist(playlist2_id, fields='name')['name']
-    base_playlist_tracks = get_tracks(sp, base_playlist_id)
-    playlist2_tracks = get_tracks(sp, playlist2_id)
+    playlist_names = get_playlist_names(sp, (base_playlist_id, *playlist_ids))
+    base_playlist_name = playlist_names[0]
+    other_playlist_names = format_playlist_names(playlist_names[1:])
+    # The base playlist is streamed against the other ones, which have to be complete
+    other_playlists = [get_tracks(sp, playlist_id) for playlist_id in playlist_ids]
+    difference = set_operations.difference(iter_tracks(sp, base_playlist_id), *other_playlists)
+    print_set_operation_result(difference,
+                               f'Tracks from "{base_playlist_name}" that are missing from {other_playlist_names}:',
+                               f'{other_playlist_names} contain all tracks from "{base_playlist_name}"')
+    return difference
 
-    difference = [track for track in base_playlist_tracks if track not in playlist2_tracks]
 
-    if difference:
-        print(f'Tracks from "{base_playlist_name}" that are missing from "{playlist2_name}":')
-        [print(f'   {track["name"]}') for track in difference]
-    else:
-        print(f'"{playlist2_name}" contains all tracks from "{base_playlist_name}"')
+def get_symmetric_difference(sp, *playlist_ids):
+    """
+    Returns a list of tuples of the form (track ID, multiplicities) of
+    all the tracks present in exactly one of the playlists
+    """
 
-    return difference
+    playlist_names, playlists = get_playlists(sp, playlist_ids)
+    symmetric_difference = set_operations.symmetric_difference(*playlists)
+    print_set_operation_result(symmetric_difference,
+                               f'Tracks present in only one of playlists {format_playlist_names(playlist_names)}:',
+                               f'Playlists {format_playlist_names(playlist_names)} contain the same tracks')
+    return symmetric_difference
+
+
+def get_playlists(sp, playlist_ids):
+    """ Returns a tuple of the form (names, track IDs) for the playlists with the given IDs """
+
+    playlists = [get_tracks(sp, playlist_id) for playlist_id in playlist_ids]
+    return get_playlist_names(sp, playlist_ids), playlists
 
 
-def convert_to_mp3(sp, playlist_id, save_path):
-    """ Converts the given playlist to MP3 files and saves them to the given path """
+def get_playlist_names(sp, playlist_ids):
+    """ Returns the names of the playlists with the given IDs """
 
-    print('Getting track URLs...')
+    return [call_with_backoff(sp.playlist, playlist_id, fields='name')['name'] for playlist_id in playlist_ids]
 
-    tracks = get_tracks(sp, playlist_id)
-    track_urls = []
-    # In the case of an error, the download is retried once later
-    retried_tracks = []
-    tracks_not_downloaded = []
 
-    for index, track in enumerate(tracks):
-        youtube_search_url = get_youtube_search_url(artist_name=track['artist'], track_name=track['name'])
-        try:
-            track_url = get_first_result_url(youtube_search_url, track['name'])
-        except IndexError:
-            tracks_not_downloaded.append(track)
-            continue
-        if track_url:
-            track_urls.append(track_url)
+def format_playlist_names(playlist_names):
+    """ Returns the given playlist names quoted and separated by commas """
+
+    return ', '.join(f'"{playlist_name}"' for playlist_name in playlist_names)
+
+
+def print_set_operation_result(result, title, empty_message):
+    """ Prints the tracks resulting from a set operation, along with their clone multiplicities """
+
+    if not result:
+        print(empty_message)
+        return
+    print(title)
+    for track, multiplicities in result:
+        if any(multiplicity > 1 for multiplicity in multiplicities):
+            multiplicities_text = ', '.join(str(multiplicity) for multiplicity in multiplicities)
+            print(f'   {TRACKS.get_name(track)} (occurrences: {multiplicities_text})')
         else:
-            if track in retried_tracks:
-                tracks_not_downloaded.append(track)
-            else:
-                tracks.append(track)
-                retried_tracks.append(track)
+            print(f'   {TRACKS.get_name(track)}')
 
-    print('Done')
 
-    download_tracks(track_urls, save_path)
+def convert_to_mp3(sp, playlist_id, save_path, sync=False, delete_removed=False, resolution_cache=None):
+    """
+    Converts the given playlist to MP3 files and saves them to the given path. A manifest of
+    the converted tracks is kept there. When syncing, only tracks without an up-to-date file in
+    the manifest are converted, and files of tracks removed from the playlist can be deleted.
+    Returns a dict with the files of the converted tracks and the tracks which could not be downloaded
+    """
+
+    print('Converting tracks...')
+
+    track_manifest = manifest.load_manifest(save_path)
+    playlist_uris = set()
+    up_to_date_uris = []
+
+    def iter_tracks_to_convert():
+        # Streamed, so that the first tracks are converted while the later pages are still loading.
+        # The conversion works with whole tracks, since it needs their names and artists anyway
+        for track_id in iter_tracks(sp, playlist_id):
+            uri = TRACKS.get_uri(track_id)
+            if uri in playlist_uris:
+                continue
+            playlist_uris.add(uri)
+            if sync and uri in track_manifest and manifest.is_up_to_date(save_path, track_manifest[uri]):
+                up_to_date_uris.append(uri)
+                continue
+            yield TRACKS.get_track(track_id)
+
+    try:
+        converted_tracks, tracks_not_downloaded = convert_tracks(iter_tracks_to_convert(), save_path,
+                                                                   resolution_cache=resolution_cache)
+    except InterruptedConversion as e:
+        # The playlist failed to load, so the files converted until then are kept, but none are deleted
+        for track, video_url, file_path in e.converted_tracks:
+            track_manifest[track['uri']] = manifest.create_entry(video_url, file_path)
+        manifest.save_manifest(save_path, track_manifest)
+        raise e.error
+    if sync:
+        print(f'{len(up_to_date_uris)} tracks were up to date')
+    for track, video_url, file_path in converted_tracks:
+        track_manifest[track['uri']] = manifest.create_entry(video_url, file_path)
+    if delete_removed:
+        for uri in [uri for uri in track_manifest if uri not in playlist_uris]:
+            entry = track_manifest.pop(uri)
+            manifest.delete_entry_file(save_path, entry)
+            print(f'Deleted "{entry["file"]}", since its track was removed from the playlist')
+    manifest.save_manifest(save_path, track_manifest)
+
+    print('Done')
 
     if tracks_not_downloaded:
         print('\n(!) Could not download following tracks:')
         for track in tracks_not_downloaded:
             print(track['name'])
 
-
-def get_first_result_url(search_url, track_name):
-    """ Returns the URL of the first result of the search """
-
-    page = requests.get(search_url)
-    track_name_core = get_track_name_core(track_name)
-    pattern = rf'(?<={track_name_core}).*?(?<="videoId":").*?(?=")'
-    matches = re.findall(pattern, page.text, flags=re.DOTALL)
-    last_quote_index = get_last_occurrence_index(matches[0], '"')
-    video_id = matches[0][last_quote_index + 1:]
-    if not video_id:
-        return None
-    url = f'https://www.youtube.com/watch?v={video_id}'
-
-    # --- This is the right way. However, currently there is a bug in requests-html, and it doesn't work ---
-    # session = HTMLSession()
-    # response = session.get(search_url)
-    # response.html.render()
-    # suffix = response.html.xpath('//a[@class="yt-simple-endpoint inline-block style-scope ytd-thumbnail"]/@href',
-    #     first=True)
-    # if not suffix:
-    #     return None
-    # url = str(('https://www.youtube.com' + suffix))
-
-    return url
-
-
-def download_tracks(urls, save_path):
-    """ Saves the given tracks as mp3 files to the given location """
-
-    print('Downloading tracks...')
-    ydl_opts = {
-        'outtmpl': f'{save_path}/%(title)s.%(ext)s',
-        'format': 'bestaudio/best',
-        'postprocessors': [{
-            'key': 'FFmpegExtractAudio',
-            'preferredcodec': 'mp3',
-            'preferredquality': '192',
-        }],
-        "logger": CustomLogger,
+    return {
+        'converted': [{'name': track['name'], 'file': track_manifest[track['uri']]['file']}
+                      for track, _, _ in converted_tracks],
+        'not_downloaded': [track['name'] for track in tracks_not_downloaded],
     }
-    with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-        for url in urls:
-            try:
-                ydl.download([url])
-            except:
-                continue
-    print('Done')
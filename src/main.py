@@ -1,22 +1,32 @@
 import sys
 import time
 
-import spotipy
-from dotenv import load_dotenv
-from gooey import Gooey, GooeyParser
-from spotipy.oauth2 import SpotifyOAuth
+import api
+import batch
+import playlist_cache
+from constants import BATCH_CALLS_PER_SECOND
+from profiling import PROFILER
+from resolution_cache import ResolutionCache
+from util import get_total_time
 
-from features import get_intersection, get_difference, shuffle, convert_to_mp3
-from util import get_playlist_id, get_total_time, test
 
-
-@Gooey(program_name='Spotify Utils', default_size=(500, 750), tabbed_groups=True, required_cols=1, optional_cols=1,
-       show_success_modal=False, show_failure_modal=False)
 def main():
-    start_time = time.time()
+    """ Starts the GUI. Gooey is imported only here, since it is slow to import and not needed headless """
+
+    from gooey import Gooey, GooeyParser
+
+    @Gooey(program_name='Spotify Utils', default_size=(500, 750), tabbed_groups=True, required_cols=1,
+           optional_cols=1, show_success_modal=False, show_failure_modal=False)
+    def run_gui():
+        parser = GooeyParser()
+        add_arguments(parser)
+        run(parser.parse_args())
 
-    load_dotenv()
-    parser = GooeyParser()
+    run_gui()
+
+
+def add_arguments(parser):
+    """ Adds the options of all features to the given parser """
 
     shuffle_arg_group = parser.add_argument_group(title='Shuffle',
                                                   description='Shuffle a playlist and reorder it, so that the tracks that are present twice (from Good playlist) or three times (from Best playlist) are not close to each other. You may just provide a main playlist and uncheck "Reorder playlist" in order to just shuffle the given playlist.')
@@ -32,59 +42,109 @@ def main():
                                    help='  Reorder playlist', gooey_options={'show_label': False})
     shuffle_arg_group.add_argument('--test', widget='CheckBox', default=True, action='store_false',
                                    help='  Check if playlist is well-ordered', gooey_options={'show_label': False})
+    shuffle_arg_group.add_argument('--dry_run', widget='CheckBox', action='store_true',
+                                   help='  Only show how many API calls shuffling would take',
+                                   gooey_options={'show_label': False})
 
     mp3_arg_group = parser.add_argument_group(title='Convert to MP3',
                                               description='Convert a playlist to MP3 files and save them locally')
     mp3_arg_group.add_argument('--playlist', help='Playlist name', gooey_options={'show_label': False})
     mp3_arg_group.add_argument('--save_path', help='Full path to save MP3 songs to',
                                gooey_options={'show_label': False})
+    mp3_arg_group.add_argument('--sync', widget='CheckBox', action='store_true',
+                               help='  Only convert tracks added since the last conversion',
+                               gooey_options={'show_label': False})
+    mp3_arg_group.add_argument('--delete_removed', widget='CheckBox', action='store_true',
+                               help='  Delete MP3 files of tracks removed from the playlist',
+                               gooey_options={'show_label': False})
 
     misc_arg_group = parser.add_argument_group(title='Misc')
-    misc_arg_group.add_argument('--intersection', nargs=2,
-                                help='Two playlist names between quotation marks, separated by space. Get the intersection of the two playlists')
-    misc_arg_group.add_argument('--difference', nargs=2,
-                                help='Two playlist names between quotation marks, separated by space. Get the tracks present in the first playlist but missing from the second one')
+    misc_arg_group.add_argument('--intersection', nargs='+',
+                                help='Two or more playlist names between quotation marks, separated by space. Get the tracks present in all the playlists')
+    misc_arg_group.add_argument('--difference', nargs='+',
+                                help='Two or more playlist names between quotation marks, separated by space. Get the tracks present in the first playlist but missing from all the other ones')
+    misc_arg_group.add_argument('--union', nargs='+',
+                                help='Two or more playlist names between quotation marks, separated by space. Get the tracks present in any of the playlists')
+    misc_arg_group.add_argument('--symmetric_difference', nargs='+',
+                                help='Two or more playlist names between quotation marks, separated by space. Get the tracks present in exactly one of the playlists')
+    misc_arg_group.add_argument('--export_resolution_cache', widget='FileSaver',
+                                help='File to export the cache of tracks resolved to YouTube videos to')
+    misc_arg_group.add_argument('--import_resolution_cache', widget='FileChooser',
+                                help='File to import a cache of tracks resolved to YouTube videos from')
+    misc_arg_group.add_argument('--batch', widget='FileChooser',
+                                help='JSON file with a list of shuffle, test, set operation or convert jobs to run together')
+    misc_arg_group.add_argument('--profile', widget='FileSaver',
+                                help='JSON file to save the time spent in each phase and the API call counts to, as a trace')
+    misc_arg_group.add_argument('--invalidate_cache', widget='CheckBox', action='store_true',
+                                help='  Clear the cached playlists and fetch them again',
+                                gooey_options={'show_label': False})
 
-    args = parser.parse_args()
+
+def run(args):
+    """ Runs the features chosen by the parsed arguments and returns their results """
+
+    start_time = time.time()
+    results = {}
+    PROFILER.reset()
+
+    if args.invalidate_cache:
+        playlist_cache.invalidate()
+    if args.import_resolution_cache or args.export_resolution_cache:
+        resolution_cache = ResolutionCache()
+        if args.import_resolution_cache:
+            imported_count = resolution_cache.import_from(args.import_resolution_cache)
+            resolution_cache.save()
+            print(f'Imported {imported_count} resolved tracks')
+        if args.export_resolution_cache:
+            resolution_cache.export_to(args.export_resolution_cache)
+            print(f'Exported the resolved tracks to "{args.export_resolution_cache}"')
 
     # Peculiarity of ArgParse and the fact that the default values are True
     should_shuffle = not args.shuffle
     should_reorder = not args.reorder
     should_test = not args.test
 
-    sp = spotipy.Spotify(
-        auth_manager=SpotifyOAuth(scope='playlist-modify-private playlist-modify-public'),
-        requests_timeout=100,
-        retries=10)
+    # Checked before connecting, rather than by the set operations after it
+    for operation_name in ('intersection', 'difference', 'union', 'symmetric_difference'):
+        if getattr(args, operation_name):
+            try:
+                api.check_set_operation_playlists(getattr(args, operation_name), f'--{operation_name}')
+            except ValueError as e:
+                sys.exit(str(e))
+
+    # Batch jobs run at the same time, so they share a budget of API calls
+    sp = api.create_client(calls_per_second=BATCH_CALLS_PER_SECOND if args.batch else None)
 
-    if args.playlist or args.save_path or args.intersection or args.difference:
+    if args.batch:
+        results['batch'] = batch.run_jobs(sp, batch.load_jobs(args.batch))
+    elif args.playlist or args.save_path or args.intersection or args.difference or args.union \
+            or args.symmetric_difference or args.import_resolution_cache or args.export_resolution_cache:
         if args.playlist and args.save_path:
-            playlist_id = get_playlist_id(sp, args.playlist)
-            convert_to_mp3(sp, playlist_id, args.save_path)
+            results['convert'] = api.convert(args.playlist, args.save_path, args.sync, args.delete_removed, sp=sp)
         if args.intersection:
-            playlist1_id = get_playlist_id(sp, args.intersection[0])
-            playlist2_id = get_playlist_id(sp, args.intersection[1])
-            get_intersection(sp, playlist1_id, playlist2_id)
+            results['intersection'] = api.format_set_operation_result(api.intersection(*args.intersection, sp=sp))
         if args.difference:
-            base_playlist_id = get_playlist_id(sp, args.difference[0])
-            playlist2_id = get_playlist_id(sp, args.difference[1])
-            get_difference(sp, base_playlist_id, playlist2_id)
+            results['difference'] = api.format_set_operation_result(api.difference(*args.difference, sp=sp))
+        if args.union:
+            results['union'] = api.format_set_operation_result(api.union(*args.union, sp=sp))
+        if args.symmetric_difference:
+            results['symmetric_difference'] = api.format_set_operation_result(
+                api.symmetric_difference(*args.symmetric_difference, sp=sp))
     elif args.main_playlist:
-        main_playlist_id = get_playlist_id(sp, args.main_playlist)
-        if should_reorder or should_test:
-            if args.good_playlist is None or args.best_playlist is None:
-                sys.exit('Please provide Good and Best playlists.')
-            good_playlist_id = get_playlist_id(sp, args.good_playlist)
-            best_playlist_id = get_playlist_id(sp, args.best_playlist)
-        else:
-            good_playlist_id = None
-            best_playlist_id = None
+        if (should_reorder or should_test) and (args.good_playlist is None or args.best_playlist is None):
+            sys.exit('Please provide Good and Best playlists.')
         if should_shuffle or should_reorder:
-            shuffle(sp, main_playlist_id, good_playlist_id, best_playlist_id, should_shuffle, should_reorder)
+            results['shuffle'] = api.shuffle(args.main_playlist, args.good_playlist, args.best_playlist,
+                                             should_shuffle, should_reorder, args.dry_run, sp=sp)
         if should_test:
-            test(sp, main_playlist_id, good_playlist_id, best_playlist_id)
+            results['test'] = api.test(args.main_playlist, args.good_playlist, args.best_playlist, sp=sp)
 
-    print(f'\nTotal time: {get_total_time(start_time)}\n\n')
+    print(f'\nTotal time: {get_total_time(start_time)} ({sp.get_stats()})\n\n')
+    if args.profile:
+        print(PROFILER.get_summary())
+        PROFILER.write_report(args.profile)
+        print(f'\nSaved the profile to "{args.profile}", it can be opened in chrome://tracing or Perfetto')
+    return results
 
 
 if __name__ == '__main__':
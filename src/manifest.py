@@ -0,0 +1,65 @@
+import hashlib
+import json
+import os
+from urllib.parse import urlparse, parse_qs
+
+# Kept in the directory the MP3 files are saved to
+MANIFEST_FILE_NAME = '.spotify-utils-manifest.json'
+
+
+def get_manifest_path(save_path):
+    """ Returns the path of the manifest in the given directory """
+
+    return os.path.join(save_path, MANIFEST_FILE_NAME)
+
+
+def load_manifest(save_path):
+    """
+    Returns the manifest of the MP3 files in the given directory. It maps every
+    track's URI to a dict with the YouTube video ID, file name, size and checksum
+    """
+
+    try:
+        with open(get_manifest_path(save_path), encoding='utf-8') as manifest_file:
+            return json.load(manifest_file)
+    except (OSError, ValueError):
+        return {}
+
+
+def save_manifest(save_path, manifest):
+    """ Saves the given manifest to the given directory, creating it if nothing was downloaded there yet """
+
+    os.makedirs(save_path, exist_ok=True)
+    manifest_path = get_manifest_path(save_path)
+    temp_file_path = f'{manifest_path}.tmp'
+    with open(temp_file_path, 'w', encoding='utf-8') as manifest_file:
+        json.dump(manifest, manifest_file, indent=2)
+    os.replace(temp_file_path, manifest_path)
+
+
+def create_entry(video_url, file_path):
+    """ Returns the manifest entry for the given downloaded file """
+
+    with open(file_path, 'rb') as mp3_file:
+        checksum = hashlib.sha256(mp3_file.read()).hexdigest()
+    return {
+        'video_id': parse_qs(urlparse(video_url).query).get('v', [None])[0],
+        'file': os.path.basename(file_path),
+        'size': os.path.getsize(file_path),
+        'sha256': checksum,
+    }
+
+
+def is_up_to_date(save_path, entry):
+    """ Checks whether the file of the given manifest entry is still there and unchanged in size """
+
+    file_path = os.path.join(save_path, entry['file'])
+    return os.path.isfile(file_path) and os.path.getsize(file_path) == entry['size']
+
+
+def delete_entry_file(save_path, entry):
+    """ Deletes the file of the given manifest entry, if it is still there """
+
+    file_path = os.path.join(save_path, entry['file'])
+    if os.path.isfile(file_path):
+        os.remove(file_path)
@@ -0,0 +1,93 @@
+from collections import Counter, defaultdict
+from random import random, randrange, uniform
+
+from clone_census import get_clone_positions
+from constants import LOW_MIN_DISTANCE_TWO_CLONES_AS_FRACTION, HIGH_MIN_DISTANCE_TWO_CLONES_AS_FRACTION, \
+    LOW_MIN_DISTANCE_THREE_CLONES_AS_FRACTION, HIGH_MIN_DISTANCE_THREE_CLONES_AS_FRACTION
+
+
+def get_min_distance_fractions(clones_count):
+    """
+    Returns a tuple of the form (low, high) with the bounds of the minimal
+    distance between clones of a track, as a fraction of the playlist size
+    """
+
+    if clones_count == 2:
+        return LOW_MIN_DISTANCE_TWO_CLONES_AS_FRACTION, HIGH_MIN_DISTANCE_TWO_CLONES_AS_FRACTION
+    if clones_count == 3:
+        return LOW_MIN_DISTANCE_THREE_CLONES_AS_FRACTION, HIGH_MIN_DISTANCE_THREE_CLONES_AS_FRACTION
+    # Same pattern as the fractions for two and three clones
+    return 1 / (clones_count + 2), 1 / (clones_count + 1)
+
+
+def schedule_clones(tracks):
+    """
+    Returns the given tracks in a new order, in which the clones of every track
+    are evenly spaced, with some jitter, and further apart than the high bound of
+    the minimal distance for their number of clones (also around the end of the
+    playlist). Tracks without clones, as well as the first clones of the other
+    tracks, keep their order relative to each other.
+
+    Every track occurrence gets a phase in [0, 1) and the tracks are sorted by it.
+    Tracks with the same number of clones form a group, and the phases of a group
+    are spread evenly over [0, 1). This way any interval holds about as many tracks
+    of each group as its length allows, so the distance between two clones never falls
+    below the spacing by more than the number of groups. The slack between the spacing
+    and the high bound of the min distance is used for the jitter
+    """
+
+    playlist_size = len(tracks)
+    clone_indices = get_clone_positions(tracks)
+    # Tracks with the same number of clones, in the order of their first occurrence
+    groups = defaultdict(list)
+    for indices in clone_indices.values():
+        groups[len(indices)].append(indices)
+
+    # Largest jitter (as a phase) which still keeps the clones of every group far enough apart
+    max_jitter = 0.0
+    clone_counts = [clones_count for clones_count in groups if clones_count > 1]
+    if clone_counts:
+        max_jitter_in_positions = min(
+            playlist_size * (1 / clones_count - get_min_distance_fractions(clones_count)[1]) - len(groups) - 1
+            for clones_count in clone_counts) / 4
+        max_jitter = max(0.0, max_jitter_in_positions) / playlist_size
+
+    phases = [0.0] * playlist_size
+    for clones_count, group in groups.items():
+        group_offset = random()
+        for stratum, indices in enumerate(group):
+            # Strata of all groups together cover [0, 1) evenly
+            phase = (stratum + group_offset) / (clones_count * len(group))
+            for clone_number, index in enumerate(indices):
+                jitter = uniform(-max_jitter, max_jitter) if clones_count > 1 else 0.0
+                phases[index] = (phase + clone_number / clones_count + jitter) % 1
+
+    return [tracks[index] for index in sorted(range(playlist_size), key=phases.__getitem__)]
+
+
+def place_local_tracks(non_local_tracks, local_tracks):
+    """
+    Returns the non-local tracks in their order, with the local tracks placed
+    in between. The first clone of every local track goes to a random
+    position and the others follow evenly spaced
+    """
+
+    playlist_size = len(non_local_tracks) + len(local_tracks)
+    clone_counts = Counter(local_tracks)
+    first_positions = {track: randrange(playlist_size) for track in clone_counts}
+    placed_clones = Counter()
+    target_positions = []
+    for track in local_tracks:
+        position = round(first_positions[track] + placed_clones[track] * playlist_size / clone_counts[track])
+        target_positions.append((position % playlist_size, track))
+        placed_clones[track] += 1
+
+    ordered_tracks = list(non_local_tracks)
+    last_position = -1
+    # Inserting from the front, so every insertion lands at its final position.
+    # Local tracks aiming at the same position end up next to each other
+    for position, track in sorted(target_positions, key=lambda target_position: target_position[0]):
+        position = max(position, last_position + 1)
+        ordered_tracks.insert(position, track)
+        last_position = position
+    return ordered_tracks
@@ -0,0 +1,81 @@
+import json
+import os
+
+from constants import CACHE_DIR, MAX_PLAYLIST_CACHE_SIZE_BYTES
+from track_store import TRACKS, create_playlist
+
+PLAYLIST_CACHE_DIR = os.path.join(CACHE_DIR, 'playlists')
+# Order of the track fields in the cache files
+TRACK_FIELDS = ('uri', 'name', 'artist', 'is_local')
+
+
+def get_cache_file_path(playlist_id):
+    """ Returns the path of the file the given playlist is cached in """
+
+    return os.path.join(PLAYLIST_CACHE_DIR, f'{playlist_id}.json')
+
+
+def load_tracks(playlist_id, snapshot_id):
+    """
+    Returns the track IDs of the cached tracks of the given playlist, or None
+    if the playlist is not cached or has changed since it was cached
+    """
+
+    cache_file_path = get_cache_file_path(playlist_id)
+    try:
+        with open(cache_file_path, encoding='utf-8') as cache_file:
+            cached = json.load(cache_file)
+    except (OSError, ValueError):
+        return None
+    if cached.get('track_fields') != list(TRACK_FIELDS) or cached['snapshot_id'] != snapshot_id:
+        return None
+    # Mark as recently used, so that it is evicted last
+    os.utime(cache_file_path)
+    return create_playlist(TRACKS.add(*row) for row in cached['tracks'])
+
+
+def save_tracks(playlist_id, snapshot_id, tracks):
+    """ Caches the given track IDs of the given playlist and evicts old playlists if the cache is too large """
+
+    os.makedirs(PLAYLIST_CACHE_DIR, exist_ok=True)
+    cache_file_path = get_cache_file_path(playlist_id)
+    temp_file_path = f'{cache_file_path}.tmp'
+    with open(temp_file_path, 'w', encoding='utf-8') as cache_file:
+        # Tracks are stored as rows instead of dicts to keep the files compact
+        json.dump({
+            'snapshot_id': snapshot_id,
+            'track_fields': TRACK_FIELDS,
+            'tracks': [[TRACKS.get_uri(track_id), TRACKS.get_name(track_id), TRACKS.get_artist(track_id),
+                        TRACKS.is_local(track_id)] for track_id in tracks],
+        }, cache_file, separators=(',', ':'))
+    os.replace(temp_file_path, cache_file_path)
+    evict(MAX_PLAYLIST_CACHE_SIZE_BYTES)
+
+
+def evict(max_size_bytes):
+    """ Deletes the least recently used cached playlists until the cache fits in the given size """
+
+    if not os.path.isdir(PLAYLIST_CACHE_DIR):
+        return
+    cache_files = [entry for entry in os.scandir(PLAYLIST_CACHE_DIR) if entry.name.endswith('.json')]
+    cache_files.sort(key=lambda entry: entry.stat().st_mtime)
+    total_size = sum(entry.stat().st_size for entry in cache_files)
+    for entry in cache_files:
+        if total_size <= max_size_bytes:
+            break
+        total_size -= entry.stat().st_size
+        os.remove(entry.path)
+
+
+def invalidate(playlist_id=None):
+    """ Deletes the given playlist from the cache, or all playlists if none is given """
+
+    if playlist_id:
+        cache_file_paths = [get_cache_file_path(playlist_id)]
+    elif os.path.isdir(PLAYLIST_CACHE_DIR):
+        cache_file_paths = [entry.path for entry in os.scandir(PLAYLIST_CACHE_DIR)]
+    else:
+        cache_file_paths = []
+    for cache_file_path in cache_file_paths:
+        if os.path.exists(cache_file_path):
+            os.remove(cache_file_path)
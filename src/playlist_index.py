@@ -0,0 +1,110 @@
+import json
+import os
+import sys
+from difflib import get_close_matches
+from time import time
+
+from constants import USER_ID, CACHE_DIR, PLAYLISTS_PAGE_SIZE, PLAYLIST_INDEX_TTL_SECONDS
+from util import fetch_pages, call_with_backoff
+
+PLAYLIST_INDEX_PATH = os.path.join(CACHE_DIR, 'playlist_index.json')
+
+
+def get_playlist_id(sp, playlist_name):
+    """ Given the playlist's name, returns its ID """
+
+    return get_playlist_ids(sp, [playlist_name])[0]
+
+
+def get_playlist_ids(sp, playlist_names):
+    """
+    Given the playlists' names, returns their IDs. A name is matched exactly
+    first and then case-insensitively. If a name can not be found in the cached
+    playlists, or its cached playlist was renamed or deleted since, they are fetched
+    again once, in case the playlist is new or another one has the name now
+    """
+
+    index, is_fetched = load_index(sp)
+    lookup = build_lookup(index)
+    indexed_names = {playlist_id: name for name, playlist_id in index}
+    cached_playlist_ids = [find_playlist_id(lookup, playlist_name) for playlist_name in playlist_names]
+    if not is_fetched and not all(playlist_id and is_named(sp, playlist_id, indexed_names[playlist_id])
+                                  for playlist_id in cached_playlist_ids):
+        index, _ = load_index(sp, refresh=True)
+        lookup = build_lookup(index)
+
+    playlist_ids = []
+    for playlist_name in playlist_names:
+        playlist_id = find_playlist_id(lookup, playlist_name)
+        if playlist_id is None:
+            suggestions = get_close_matches(playlist_name, [name for name, _ in index], n=3, cutoff=0.6)
+            suggestions_text = ', '.join(f'"{suggestion}"' for suggestion in suggestions)
+            sys.exit(f'No playlist with name "{playlist_name}" found.'
+                     + (f' Did you mean {suggestions_text}?' if suggestions else ''))
+        playlist_ids.append(playlist_id)
+    return playlist_ids
+
+
+def build_lookup(index):
+    """
+    Returns a tuple of the form (exact, case-insensitive) of dicts mapping playlist names
+    to IDs. If several playlists have the same name, the first one is used
+    """
+
+    exact_lookup = {}
+    case_insensitive_lookup = {}
+    for name, playlist_id in index:
+        exact_lookup.setdefault(name, playlist_id)
+        case_insensitive_lookup.setdefault(name.lower(), playlist_id)
+    return exact_lookup, case_insensitive_lookup
+
+
+def find_playlist_id(lookup, playlist_name):
+    """ Returns the ID of the playlist with the given name, or None if there is none """
+
+    exact_lookup, case_insensitive_lookup = lookup
+    return exact_lookup.get(playlist_name, case_insensitive_lookup.get(playlist_name.lower()))
+
+
+def is_named(sp, playlist_id, playlist_name):
+    """
+    Returns whether the playlist with the given ID still exists and has the given name. Its name is
+    fetched as the set operations fetch it, so the caching client answers them from the cache
+    """
+
+    # Imported only here, since spotipy is slow to import
+    from spotipy import SpotifyException
+
+    try:
+        return call_with_backoff(sp.playlist, playlist_id, fields='name')['name'] == playlist_name
+    except SpotifyException as e:
+        if e.http_status != 404:
+            raise
+        return False
+
+
+def load_index(sp, refresh=False):
+    """
+    Returns a tuple of the form (index, is fetched), where index is a list of tuples
+    of the form (name, ID) of all the user's playlists. The index is cached and only
+    fetched again if it is too old or on refresh
+    """
+
+    if not refresh:
+        try:
+            with open(PLAYLIST_INDEX_PATH, encoding='utf-8') as index_file:
+                cached = json.load(index_file)
+            if time() - cached['fetched_at'] < PLAYLIST_INDEX_TTL_SECONDS:
+                return [tuple(entry) for entry in cached['playlists']], False
+        except (OSError, ValueError, KeyError):
+            pass
+
+    pages = fetch_pages(sp.user_playlists, USER_ID, page_size=PLAYLISTS_PAGE_SIZE)
+    index = [(playlist['name'], playlist['id']) for page in pages for playlist in page['items']]
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    # Written to a temporary file first, so that runs reading the index at the same time never see half of it
+    temp_file_path = f'{PLAYLIST_INDEX_PATH}.tmp'
+    with open(temp_file_path, 'w', encoding='utf-8') as index_file:
+        json.dump({'fetched_at': time(), 'playlists': index}, index_file)
+    os.replace(temp_file_path, PLAYLIST_INDEX_PATH)
+    return index, True
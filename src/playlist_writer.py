@@ -0,0 +1,221 @@
+from bisect import bisect_left
+from collections import defaultdict
+
+from constants import PAGE_SIZE
+from track_store import TRACKS
+from util import divide_in_chunks, call_with_backoff
+
+# Calls which can be made against a given snapshot of the playlist
+SNAPSHOT_METHODS = {'playlist_reorder_items', 'playlist_remove_all_occurrences_of_items'}
+
+
+def plan_rewrite(current_tracks, target_tracks):
+    """
+    Returns the shortest list of API calls found, which change the order of a
+    playlist from the current one to the target one, both given as track IDs.
+    Each call is a tuple of the form (method name, kwargs), without the playlist
+    ID. Local tracks can not be added through the API, so they are only ever moved
+    """
+
+    current_tracks = list(current_tracks)
+    target_tracks = list(target_tracks)
+    local_tracks = {track for track in current_tracks if TRACKS.is_local(track)}
+    non_local_target_tracks = [track for track in target_tracks if track not in local_tracks]
+    local_current_tracks = [track for track in current_tracks if track in local_tracks]
+
+    plans = []
+    if not local_tracks and target_tracks:
+        # Replacing leaves exactly the first tracks, the rest are appended
+        plans.append(plan_replace(non_local_target_tracks))
+    # Removing keeps only the local tracks, the rest are appended after them
+    plans.append(plan_remove_and_add(current_tracks, local_tracks, non_local_target_tracks)
+                 + plan_moves(local_current_tracks + non_local_target_tracks, target_tracks))
+    moves_count = count_moves(current_tracks, target_tracks)
+    if moves_count < min(len(plan) for plan in plans):
+        plans.append(plan_moves(current_tracks, target_tracks))
+    return min(plans, key=len)
+
+
+def count_naive_rewrite_calls(current_tracks, target_tracks):
+    """
+    Returns the number of API calls it takes to remove all non-local tracks,
+    add them again in the target order and then move every local track separately
+    """
+
+    local_tracks = {track for track in current_tracks if TRACKS.is_local(track)}
+    non_local_target_tracks = [track for track in target_tracks if track not in local_tracks]
+    local_tracks_count = len(current_tracks) - len(non_local_target_tracks)
+    return len(plan_remove_and_add(current_tracks, local_tracks, non_local_target_tracks)) + local_tracks_count
+
+
+def plan_replace(tracks):
+    """ Returns the calls which replace all the tracks of a playlist with the given ones """
+
+    chunks = divide_in_chunks(get_uris(tracks), PAGE_SIZE)
+    return [('playlist_replace_items', {'items': chunks[0]})] \
+        + [('playlist_add_items', {'items': chunk}) for chunk in chunks[1:]]
+
+
+def plan_remove_and_add(current_tracks, local_tracks, tracks):
+    """ Returns the calls which remove all non-local tracks of a playlist and then add the given ones """
+
+    tracks_to_remove = list(dict.fromkeys(track for track in current_tracks if track not in local_tracks))
+    return [('playlist_remove_all_occurrences_of_items', {'items': chunk})
+            for chunk in divide_in_chunks(get_uris(tracks_to_remove), PAGE_SIZE)] \
+        + [('playlist_add_items', {'items': chunk}) for chunk in divide_in_chunks(get_uris(tracks), PAGE_SIZE)]
+
+
+def get_uris(tracks):
+    """ Returns the URIs of the given track IDs, which is what the API takes """
+
+    return [TRACKS.get_uri(track) for track in tracks]
+
+
+def get_target_indices(current_tracks, target_tracks):
+    """
+    Returns the index in the target order of each current track.
+    The clones of a track keep their order relative to each other
+    """
+
+    target_indices_by_track = defaultdict(list)
+    for index, track in reversed(list(enumerate(target_tracks))):
+        target_indices_by_track[track].append(index)
+    return [target_indices_by_track[track].pop() for track in current_tracks]
+
+
+def get_longest_increasing_subsequence(values):
+    """ Returns the set of values forming the longest increasing subsequence of the given distinct values """
+
+    tails = []
+    tail_indices = []
+    previous_indices = [None] * len(values)
+    for index, value in enumerate(values):
+        position = bisect_left(tails, value)
+        if position == len(tails):
+            tails.append(value)
+            tail_indices.append(index)
+        else:
+            tails[position] = value
+            tail_indices[position] = index
+        previous_indices[index] = tail_indices[position - 1] if position else None
+    subsequence = set()
+    index = tail_indices[-1] if tail_indices else None
+    while index is not None:
+        subsequence.add(values[index])
+        index = previous_indices[index]
+    return subsequence
+
+
+def count_moves(current_tracks, target_tracks):
+    """ Returns the number of tracks which have to be moved to get from the current to the target order """
+
+    return len(current_tracks) - len(get_longest_increasing_subsequence(
+        get_target_indices(current_tracks, target_tracks)))
+
+
+def plan_moves(current_tracks, target_tracks):
+    """
+    Returns the reorder calls which turn the current order into the target one.
+    The tracks forming the longest increasing subsequence stay where they are
+    and the other ones are moved right after their predecessor. Neighbouring
+    tracks which stay neighbours are moved together as one range.
+    Tracks scattered between others which stay, like local tracks placed at random
+    positions, can't be grouped, so each of them takes a call of its own
+    """
+
+    order = get_target_indices(current_tracks, target_tracks)
+    tracks_in_place = get_longest_increasing_subsequence(order)
+    if len(tracks_in_place) == len(order):
+        return []
+    current_slots, final_slots, slots_count = get_slots(order, tracks_in_place)
+    # Tells the position of a track from the number of tracks in the slots before its own
+    filled_slots = FenwickTree(slots_count)
+    for slot in current_slots:
+        filled_slots.add(slot, 1)
+    calls = []
+    for target_index in range(len(target_tracks)):
+        if target_index in tracks_in_place:
+            continue
+        range_start = filled_slots.count_before(current_slots[target_index])
+        range_length = 1
+        while target_index + range_length < len(order) and target_index + range_length not in tracks_in_place \
+                and filled_slots.count_before(current_slots[target_index + range_length]) == range_start + range_length:
+            range_length += 1
+        tracks_in_place.update(range(target_index, target_index + range_length))
+        insert_before = filled_slots.count_before(current_slots[target_index - 1]) + 1 if target_index else 0
+        if insert_before != range_start:
+            calls.append(('playlist_reorder_items',
+                          {'range_start': range_start, 'insert_before': insert_before, 'range_length': range_length}))
+        # Right after its predecessor now, whether it was moved there or already was
+        for moved_index in range(target_index, target_index + range_length):
+            filled_slots.add(current_slots[moved_index], -1)
+            filled_slots.add(final_slots[moved_index], 1)
+            current_slots[moved_index] = final_slots[moved_index]
+    return calls
+
+
+def get_slots(order, tracks_in_place):
+    """
+    Returns a tuple of the form (current slots, final slots, slots count), holding the slot of each target index
+    before and after plan_moves moves it. Slots are in playlist order: a track which is moved ends up in a slot
+    right after the track staying in place before it in the target order, which is where it is moved to
+    """
+
+    current_keys = [None] * len(order)
+    for position, target_index in enumerate(order):
+        current_keys[target_index] = (position, 0)
+    final_keys = []
+    # Tracks before the first one staying in place are moved to the start
+    anchor_index, anchor_position = -1, -1
+    for target_index in range(len(order)):
+        if target_index in tracks_in_place:
+            anchor_index, anchor_position = target_index, current_keys[target_index][0]
+        final_keys.append((anchor_position, target_index - anchor_index))
+    slots = {key: slot for slot, key in enumerate(sorted(set(current_keys) | set(final_keys)))}
+    return [slots[key] for key in current_keys], [slots[key] for key in final_keys], len(slots)
+
+
+class FenwickTree:
+    """ Counts per slot, which tells the total count of the slots before a given one in logarithmic time """
+
+    def __init__(self, size):
+        self.sums = [0] * (size + 1)
+
+    def add(self, slot, amount):
+        index = slot + 1
+        while index < len(self.sums):
+            self.sums[index] += amount
+            index += index & -index
+
+    def count_before(self, slot):
+        total = 0
+        index = slot
+        while index > 0:
+            total += self.sums[index]
+            index -= index & -index
+        return total
+
+
+def apply_plan(sp, playlist_id, plan, snapshot_id=None):
+    """
+    Makes the planned API calls to the given playlist. Each call which supports it
+    is made against the snapshot the previous call returned, so that positions
+    refer to the expected version of the playlist, even if it is edited meanwhile
+    """
+
+    for method_name, kwargs in plan:
+        if snapshot_id and method_name in SNAPSHOT_METHODS:
+            kwargs = {**kwargs, 'snapshot_id': snapshot_id}
+        result = call_with_backoff(getattr(sp, method_name), playlist_id, **kwargs)
+        snapshot_id = (result or {}).get('snapshot_id', snapshot_id)
+    return snapshot_id
+
+
+def describe_plan(plan):
+    """ Returns a human-readable summary of the planned API calls """
+
+    call_counts = defaultdict(int)
+    for method_name, _ in plan:
+        call_counts[method_name] += 1
+    summary = ', '.join(f'{count} x {method_name}' for method_name, count in call_counts.items())
+    return f'{len(plan)} API calls' + (f' ({summary})' if summary else '')
@@ -0,0 +1,109 @@
+import json
+import os
+import threading
+from collections import Counter, defaultdict
+from contextlib import contextmanager
+from time import time, perf_counter
+
+
+class Profiler:
+    """
+    Collects the time spent in named spans (e.g. fetch, write, resolve) and named counters
+    (e.g. Spotify calls, bytes downloaded) from all threads. Every span is also kept as an
+    event in the Chrome trace format, so that the report can be opened in chrome://tracing or Perfetto
+    """
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        """ Forgets all spans and counters """
+
+        # Span name to a dict with its count, total and longest duration in seconds
+        self.span_stats = defaultdict(lambda: {'count': 0, 'total_seconds': 0.0, 'max_seconds': 0.0})
+        self.counters = Counter()
+        self.events = []
+        self.start_time = time()
+        self.lock = threading.Lock()
+
+    @contextmanager
+    def span(self, name):
+        """ Measures the time spent in the with block as a span of the given name """
+
+        start_time = time()
+        start = perf_counter()
+        try:
+            yield
+        finally:
+            self.add_span(name, start_time, perf_counter() - start)
+
+    def add_span(self, name, start_time, duration, process_id=None):
+        """ Records a span of the given name, which started at the given time and took the given seconds """
+
+        with self.lock:
+            stats = self.span_stats[name]
+            stats['count'] += 1
+            stats['total_seconds'] += duration
+            stats['max_seconds'] = max(stats['max_seconds'], duration)
+            self.events.append({
+                'name': name,
+                'ph': 'X',
+                'ts': round(start_time * 1e6),
+                'dur': round(duration * 1e6),
+                'pid': process_id or os.getpid(),
+                'tid': threading.get_ident(),
+            })
+
+    def count(self, name, amount=1):
+        """ Adds the given amount to the counter of the given name """
+
+        with self.lock:
+            self.counters[name] += amount
+
+    def get_report(self):
+        """ Returns the spans, counters and trace events collected so far as a JSON serializable dict """
+
+        with self.lock:
+            return {
+                'wall_seconds': time() - self.start_time,
+                'spans': {name: dict(stats) for name, stats in self.span_stats.items()},
+                'counters': dict(self.counters),
+                'traceEvents': list(self.events),
+            }
+
+    def get_summary(self):
+        """
+        Returns a human-readable table of the spans and counters.
+        Spans run in threads can add up to more than the wall time
+        """
+
+        report = self.get_report()
+        lines = [f'Wall time: {report["wall_seconds"]:.3f} s', '',
+                 f'{"Span":<20}{"Count":>8}{"Total (s)":>12}{"Max (s)":>10}']
+        for name, stats in sorted(report['spans'].items(), key=lambda item: -item[1]['total_seconds']):
+            lines.append(f'{name:<20}{stats["count"]:>8}{stats["total_seconds"]:>12.3f}{stats["max_seconds"]:>10.3f}')
+        lines.append('')
+        lines.extend(f'{name:<28}{value:>12g}' for name, value in sorted(report['counters'].items()))
+        return '\n'.join(lines)
+
+    def write_report(self, path):
+        """ Writes the report to the given JSON file """
+
+        with open(path, 'w', encoding='utf-8') as report_file:
+            json.dump(self.get_report(), report_file)
+
+
+def run_timed(function, *args):
+    """
+    Calls the given function and returns a tuple of the form (result, start time, duration, process ID),
+    so that spans of functions run in other processes can be added to the profiler of this one
+    """
+
+    start_time = time()
+    start = perf_counter()
+    result = function(*args)
+    return result, start_time, perf_counter() - start, os.getpid()
+
+
+# Profiler of the whole run, shared by all features
+PROFILER = Profiler()
@@ -0,0 +1,89 @@
+import json
+import os
+from threading import Lock
+from time import time
+
+from constants import CACHE_DIR, NEGATIVE_RESOLUTION_TTL_SECONDS
+
+RESOLUTION_CACHE_PATH = os.path.join(CACHE_DIR, 'resolutions.json')
+
+
+class ResolutionCache:
+    """
+    Remembers which YouTube video every track was resolved to, across runs and playlists.
+    Tracks which could not be found are remembered as well, but only for a while
+    """
+
+    def __init__(self, path=RESOLUTION_CACHE_PATH):
+        self.path = path
+        # Track key to a dict with the video ID (None if not found) and the time it was resolved
+        self.resolutions = read_resolutions(path)
+        self.lock = Lock()
+
+    def get(self, track):
+        """
+        Returns a tuple of the form (found in cache, video ID) for the given track.
+        The video ID is None if the track was not found on YouTube
+        """
+
+        with self.lock:
+            resolution = self.resolutions.get(get_track_key(track))
+        if resolution is None:
+            return False, None
+        if resolution['video_id'] is None and time() - resolution['resolved_at'] > NEGATIVE_RESOLUTION_TTL_SECONDS:
+            return False, None
+        return True, resolution['video_id']
+
+    def put(self, track, video_id):
+        """ Remembers the video the given track was resolved to, or None if it was not found """
+
+        with self.lock:
+            self.resolutions[get_track_key(track)] = {'video_id': video_id, 'resolved_at': time()}
+
+    def save(self):
+        """ Writes the cache to its file """
+
+        with self.lock:
+            write_resolutions(self.path, self.resolutions)
+
+    def export_to(self, path):
+        """ Writes the cache to the given file, e.g. to import it on another machine """
+
+        with self.lock:
+            write_resolutions(path, self.resolutions)
+
+    def import_from(self, path):
+        """ Adds the resolutions from the given exported file, keeping the newer one of each track """
+
+        imported_resolutions = read_resolutions(path)
+        with self.lock:
+            for key, resolution in imported_resolutions.items():
+                if key not in self.resolutions or self.resolutions[key]['resolved_at'] < resolution['resolved_at']:
+                    self.resolutions[key] = resolution
+        return len(imported_resolutions)
+
+
+def get_track_key(track):
+    """ Returns the key of the given track in the cache. Local tracks don't have ID, so their URI is used """
+
+    return track['id'] or track['uri']
+
+
+def read_resolutions(path):
+    """ Returns the resolutions saved in the given file, or an empty dict if there is none """
+
+    try:
+        with open(path, encoding='utf-8') as resolutions_file:
+            return json.load(resolutions_file)
+    except (OSError, ValueError):
+        return {}
+
+
+def write_resolutions(path, resolutions):
+    """ Saves the given resolutions to the given file """
+
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    temp_file_path = f'{path}.tmp'
+    with open(temp_file_path, 'w', encoding='utf-8') as resolutions_file:
+        json.dump(resolutions, resolutions_file, separators=(',', ':'))
+    os.replace(temp_file_path, path)
@@ -0,0 +1,72 @@
+from collections import Counter
+
+
+def count_tracks(tracks):
+    """ Returns a dict mapping each track ID to the number of times it occurs in the given track IDs """
+
+    return Counter(tracks)
+
+
+def get_unique_tracks(tracks):
+    """ Returns the given tracks without clones, keeping the order of their first occurrence """
+
+    return list(dict.fromkeys(tracks))
+
+
+def with_multiplicities(tracks, track_counts):
+    """
+    Returns a list of tuples of the form (track, multiplicities), where multiplicities
+    holds the number of times the track occurs in each of the playlists
+    """
+
+    return [(track, tuple(counts[track] for counts in track_counts)) for track in tracks]
+
+
+def union(*playlists):
+    """
+    Returns the tracks present in any of the given playlists. The order of the first
+    playlist is kept, followed by the new tracks of each next playlist in their order
+    """
+
+    track_counts = [count_tracks(tracks) for tracks in playlists]
+    all_tracks = [track for tracks in playlists for track in tracks]
+    return with_multiplicities(get_unique_tracks(all_tracks), track_counts)
+
+
+def intersection(*playlists):
+    """ Returns the tracks present in all the given playlists, in the order of the first one """
+
+    track_counts = [count_tracks(tracks) for tracks in playlists]
+    common_tracks = [track for track in get_unique_tracks(playlists[0])
+                     if all(track in counts for counts in track_counts[1:])]
+    return with_multiplicities(common_tracks, track_counts)
+
+
+def difference(base_tracks, *playlists):
+    """
+    Returns the tracks present in the first playlist but missing from all the other ones.
+    The tracks of the first playlist are iterated only once, so they can be streamed
+    """
+
+    other_track_counts = [count_tracks(tracks) for tracks in playlists]
+    base_track_counts = Counter()
+    missing_tracks = []
+    for track in base_tracks:
+        if not base_track_counts[track] and not any(track in counts for counts in other_track_counts):
+            missing_tracks.append(track)
+        base_track_counts[track] += 1
+    return with_multiplicities(missing_tracks, [base_track_counts, *other_track_counts])
+
+
+def symmetric_difference(*playlists):
+    """
+    Returns the tracks present in exactly one of the given playlists.
+    The tracks are ordered by playlist and then by their order in it
+    """
+
+    track_counts = [count_tracks(tracks) for tracks in playlists]
+    # Number of playlists each track is present in
+    playlist_counts = Counter(track for counts in track_counts for track in counts)
+    all_tracks = [track for tracks in playlists for track in tracks]
+    exclusive_tracks = [track for track in get_unique_tracks(all_tracks) if playlist_counts[track] == 1]
+    return with_multiplicities(exclusive_tracks, track_counts)
@@ -0,0 +1,112 @@
+from functools import partial
+from threading import Lock
+from time import monotonic, sleep
+
+from profiling import PROFILER
+
+# Calls which only read data and can be answered from the cache
+READ_METHODS = {'playlist', 'playlist_items', 'user_playlists', 'current_user_playlists'}
+# Calls which change a playlist, so its cached data becomes outdated
+WRITE_METHODS = {'playlist_add_items', 'playlist_remove_all_occurrences_of_items', 'playlist_reorder_items',
+                 'playlist_replace_items', 'playlist_remove_specific_occurrences_of_items'}
+
+
+class CachingSpotify:
+    """
+    Wraps a spotipy.Spotify client and memoizes its read calls for
+    the duration of a run. A write call to a playlist drops all
+    cached reads of that playlist. Any other call is passed through
+    """
+
+    def __init__(self, sp):
+        self.sp = sp
+        self.cache = {}
+        self.hits = 0
+        self.misses = 0
+        self.lock = Lock()
+
+    def __getattr__(self, name):
+        attribute = getattr(self.sp, name)
+        if name in READ_METHODS:
+            return partial(self.call_cached, name, attribute)
+        if name in WRITE_METHODS:
+            return partial(self.call_and_invalidate, attribute)
+        return attribute
+
+    def call_cached(self, name, method, *args, **kwargs):
+        """ Returns the cached result of the given read call, calling the API only the first time """
+
+        key = (name, get_playlist_id_argument(args, kwargs), args, tuple(sorted(kwargs.items())))
+        with self.lock:
+            if key in self.cache:
+                self.hits += 1
+                PROFILER.count('spotify_cache_hits')
+                return self.cache[key]
+            self.misses += 1
+        # Calls through the client, so a retry after a rate limit counts again, but retries of the HTTP session don't
+        PROFILER.count('spotify_calls')
+        result = method(*args, **kwargs)
+        with self.lock:
+            self.cache[key] = result
+        return result
+
+    def call_and_invalidate(self, method, *args, **kwargs):
+        """ Makes the given write call and drops the cached reads of the affected playlist """
+
+        playlist_id = get_playlist_id_argument(args, kwargs)
+        PROFILER.count('spotify_calls')
+        result = method(*args, **kwargs)
+        with self.lock:
+            self.cache = {key: value for key, value in self.cache.items() if key[1] != playlist_id}
+        return result
+
+    def get_stats(self):
+        """ Returns a human-readable summary of the cache hits and misses """
+
+        return f'{self.hits} cache hits, {self.misses} cache misses'
+
+
+class RateLimitedSpotify:
+    """
+    Wraps a spotipy.Spotify client and spaces out its calls with a token bucket, so that all
+    threads together make at most calls_per_second calls, after a burst of at most that many
+    """
+
+    def __init__(self, sp, calls_per_second):
+        self.sp = sp
+        self.calls_per_second = calls_per_second
+        self.tokens = calls_per_second
+        self.updated_at = monotonic()
+        self.lock = Lock()
+
+    def __getattr__(self, name):
+        attribute = getattr(self.sp, name)
+        if callable(attribute):
+            return partial(self.call, attribute)
+        return attribute
+
+    def call(self, method, *args, **kwargs):
+        """ Makes the given call once the budget allows it """
+
+        self.take_token()
+        return method(*args, **kwargs)
+
+    def take_token(self):
+        """ Takes a token from the bucket, waiting until it is refilled if it is empty """
+
+        with self.lock:
+            now = monotonic()
+            self.tokens = min(self.calls_per_second,
+                              self.tokens + (now - self.updated_at) * self.calls_per_second)
+            self.updated_at = now
+            # Taking the token right away and waiting outside the lock keeps the callers in order
+            self.tokens -= 1
+            wait_time = -self.tokens / self.calls_per_second if self.tokens < 0 else 0
+        if wait_time:
+            sleep(wait_time)
+
+
+def get_playlist_id_argument(args, kwargs):
+    """ Returns the playlist ID of a playlist call, which is always its first argument """
+
+    return kwargs.get('playlist_id', args[0] if args else None)
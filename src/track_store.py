@@ -0,0 +1,106 @@
+from array import array
+from threading import Lock
+
+# Type code of the arrays holding track IDs and string table indices
+INDEX_TYPE_CODE = 'I'
+
+
+class StringTable:
+    """ Keeps every distinct string once and refers to it by its index """
+
+    def __init__(self):
+        self.strings = []
+        self.indices = {}
+
+    def intern(self, string):
+        """ Returns the index of the given string, adding it if it is new """
+
+        index = self.indices.get(string)
+        if index is None:
+            index = len(self.strings)
+            self.strings.append(string)
+            self.indices[string] = index
+        return index
+
+    def __getitem__(self, index):
+        return self.strings[index]
+
+
+class TrackStore:
+    """
+    Columnar store of all the tracks seen during a run. Every distinct URI is interned
+    to an integer track ID, so that playlists are arrays of track IDs and tracks are
+    compared as integers. Names and artists are kept in shared string tables and the
+    columns of the tracks are arrays indexed by track ID
+    """
+
+    def __init__(self):
+        self.clear()
+
+    def clear(self):
+        """ Forgets all the tracks. Track IDs handed out before must not be used anymore """
+
+        # Track ID to URI, and back. URIs are used because local tracks don't have ID
+        self.uris = []
+        self.track_ids = {}
+        self.names = StringTable()
+        self.artists = StringTable()
+        self.name_indices = array(INDEX_TYPE_CODE)
+        self.artist_indices = array(INDEX_TYPE_CODE)
+        self.local_flags = bytearray()
+        self.lock = Lock()
+
+    def add(self, uri, name, artist, is_local):
+        """ Returns the track ID of the track with the given URI, adding the track if it is new """
+
+        track_id = self.track_ids.get(uri)
+        if track_id is not None:
+            return track_id
+        with self.lock:
+            track_id = self.track_ids.get(uri)
+            if track_id is None:
+                track_id = len(self.uris)
+                self.name_indices.append(self.names.intern(name))
+                self.artist_indices.append(self.artists.intern(artist))
+                self.local_flags.append(is_local)
+                self.uris.append(uri)
+                self.track_ids[uri] = track_id
+        return track_id
+
+    def get_uri(self, track_id):
+        return self.uris[track_id]
+
+    def get_spotify_id(self, track_id):
+        """ Returns the Spotify ID of the track, which is the last part of its URI, or None for local tracks """
+
+        return None if self.local_flags[track_id] else self.uris[track_id].rsplit(':', 1)[1]
+
+    def get_name(self, track_id):
+        return self.names[self.name_indices[track_id]]
+
+    def get_artist(self, track_id):
+        return self.artists[self.artist_indices[track_id]]
+
+    def is_local(self, track_id):
+        return bool(self.local_flags[track_id])
+
+    def get_track(self, track_id):
+        """ Returns a dict with id, URI, name, artist and is_local of the track, e.g. for output """
+
+        return {
+            'id': self.get_spotify_id(track_id),
+            'uri': self.get_uri(track_id),
+            'name': self.get_name(track_id),
+            'artist': self.get_artist(track_id),
+            'is_local': self.is_local(track_id),
+        }
+
+
+def create_playlist(track_ids=()):
+    """ Returns a compact array of the given track IDs """
+
+    return array(INDEX_TYPE_CODE, track_ids)
+
+
+# Store shared by all playlists, so that the same track has the same ID in each of them
+TRACKS = TrackStore()
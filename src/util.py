@@ -1,55 +1,132 @@
 import math
-import sys
-from time import time
+import re
+import unicodedata
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from itertools import chain
+from time import time, sleep
+from urllib.parse import quote_plus
+
+import playlist_cache
+from clone_census import check_clone_playlists, print_report
+from constants import TEST_MIN_DISTANCE, CLONE_PLAYLIST_LABELS, PAGE_SIZE, MAX_CONCURRENT_REQUESTS, \
+    MAX_RATE_LIMIT_RETRIES
+from profiling import PROFILER
+from track_store import TRACKS, create_playlist
+
+
+def get_tracks(sp, playlist_id, max_concurrent_requests=MAX_CONCURRENT_REQUESTS, use_cache=True):
+    """
+    Returns an array of the track IDs (see track_store) of all the tracks
+    in the playlist with the given ID. If the playlist hasn't changed
+    since it was last fetched, the tracks are read from the cache
+    """
+
+    tracks = create_playlist()
+    for page in iter_track_pages(sp, playlist_id, max_concurrent_requests, use_cache):
+        tracks.extend(page)
+    return tracks
+
+
+def iter_tracks(sp, playlist_id, max_concurrent_requests=MAX_CONCURRENT_REQUESTS, use_cache=True):
+    """ Yields the track IDs of the tracks in the playlist with the given ID one by one, as their pages arrive """
 
-from constants import USER_ID, TEST_MIN_DISTANCE
+    return chain.from_iterable(iter_track_pages(sp, playlist_id, max_concurrent_requests, use_cache))
 
 
-def get_tracks(sp, playlist_id):
+def iter_track_pages(sp, playlist_id, max_concurrent_requests=MAX_CONCURRENT_REQUESTS, use_cache=True):
     """
-    Returns a dict with id, URI, name and is_local for all the
-    tracks in the playlist with the given ID
+    Yields arrays of the track IDs of the tracks in the playlist with the given ID, page by page
+    in their order, as soon as each page arrives. A cached playlist is yielded as a single page.
+    The fetched tracks are cached once the last page has been yielded
     """
 
-    result = []
-    page_size = 100
-    offset = 0
-    while True:
-        track_batch = sp.playlist_items(playlist_id, limit=page_size, offset=offset)
-        result.extend([{
-            'id': item['track']['id'],
-            'uri': item['track']['uri'],
-            'name': item['track']['name'],
-            'artist': item['track']['artists'][0]['name'],
-            'is_local': item['track']['is_local'],
-        } for item in track_batch['items']])
-        if not track_batch['next']:
-            break
-        offset += page_size
-    return result
+    if use_cache:
+        snapshot_id = call_with_backoff(sp.playlist, playlist_id, fields='snapshot_id')['snapshot_id']
+        tracks = playlist_cache.load_tracks(playlist_id, snapshot_id)
+        if tracks is not None:
+            PROFILER.count('playlist_cache_hits')
+            yield tracks
+            return
+        PROFILER.count('playlist_cache_misses')
+
+    tracks = create_playlist()
+    for page in iter_pages(sp.playlist_items, playlist_id, page_size=PAGE_SIZE,
+                           max_concurrent_requests=max_concurrent_requests):
+        page_tracks = create_playlist(TRACKS.add(
+            item['track']['uri'],
+            item['track']['name'],
+            item['track']['artists'][0]['name'],
+            item['track']['is_local'],
+        ) for item in page['items'])
+        tracks.extend(page_tracks)
+        yield page_tracks
+    if use_cache:
+        playlist_cache.save_tracks(playlist_id, snapshot_id, tracks)
+
+
+def fetch_pages(request, *args, page_size, max_concurrent_requests=MAX_CONCURRENT_REQUESTS):
+    """ Returns all the pages of the given paged Spotify API request """
+
+    return list(iter_pages(request, *args, page_size=page_size, max_concurrent_requests=max_concurrent_requests))
+
+
+def iter_pages(request, *args, page_size, max_concurrent_requests=MAX_CONCURRENT_REQUESTS):
+    """
+    Yields the pages of the given paged Spotify API request in their order. The first
+    page tells the total number of items, the rest are fetched concurrently
+    """
 
+    def fetch_page(offset):
+        with PROFILER.span('fetch'):
+            return call_with_backoff(request, *args, limit=page_size, offset=offset)
 
-def get_nr_of_tracks(sp, playlist_id):
-    """ Returns the number of tracks in the playlist with the given ID """
+    first_page = fetch_page(0)
+    yield first_page
+    offsets = range(page_size, first_page['total'], page_size)
+    if offsets:
+        with ThreadPoolExecutor(max_workers=max_concurrent_requests) as executor:
+            # map keeps the order of the offsets, no matter in which order the pages arrive
+            yield from executor.map(fetch_page, offsets)
 
-    return sp.playlist_items(playlist_id)['total']
 
+def call_with_backoff(request, *args, **kwargs):
+    """
+    Calls the given Spotify API request, waiting and retrying when
+    rate limited (HTTP 429) for as long as the Retry-After header says
+    """
+
+    # Imported only here, since spotipy is slow to import
+    from spotipy import SpotifyException
+
+    for attempt in range(MAX_RATE_LIMIT_RETRIES):
+        try:
+            return request(*args, **kwargs)
+        except SpotifyException as e:
+            if e.http_status != 429 or attempt == MAX_RATE_LIMIT_RETRIES - 1:
+                raise
+            retry_after = (e.headers or {}).get('Retry-After')
+            wait_time = int(retry_after) if retry_after else 2 ** attempt
+            PROFILER.count('rate_limit_retries')
+            PROFILER.count('rate_limit_wait_seconds', wait_time)
+            sleep(wait_time)
 
-def get_playlist_id(sp, playlist_name):
-    """ Given the playlist's name, returns its ID """
 
-    playlists = sp.user_playlists(USER_ID)['items']
-    for playlist in playlists:
-        if playlist['name'].lower() == playlist_name.lower():
-            return playlist['id']
-    sys.exit(f'No playlist with name "{playlist_name}" found.')
+def get_nr_of_tracks(sp, playlist_id):
+    """ Returns the number of tracks in the playlist with the given ID """
+
+    return call_with_backoff(sp.playlist_items, playlist_id)['total']
 
 
 def get_total_time(start_time):
     """ Returns the time elapsed since the start_time in a human-readable way """
 
-    end_time = time()
-    total_time = end_time - start_time
+    return format_duration(time() - start_time)
+
+
+def format_duration(total_time):
+    """ Returns the given number of seconds in a human-readable way """
+
     unit = 'seconds'
     if total_time >= 3600:
         total_time /= 3600
@@ -68,12 +145,13 @@ def divide_in_chunks(list_to_divide, chunk_size):
 
 
 def test(sp, main_playlist_id, good_playlist_id, best_playlist_id):
-    """ Checks playlists are OK """
+    """ Checks playlists are OK and returns the results of the checks """
 
     print('\nStarted test...')
-    check_well_ordered(sp, main_playlist_id)
-    check_clones_ok(sp, main_playlist_id, good_playlist_id, best_playlist_id)
+    spacing = check_well_ordered(sp, main_playlist_id)
+    clone_problems = check_clones_ok(sp, main_playlist_id, good_playlist_id, best_playlist_id)
     print('\nDone')
+    return {'spacing': spacing, 'clone_problems': clone_problems}
 
 
 def check_well_ordered(sp, playlist_id):
@@ -83,67 +161,83 @@ def check_well_ordered(sp, playlist_id):
     """
 
     tracks = get_tracks(sp, playlist_id)
-    playlist_size = len(tracks)
-    min_distance = math.floor(playlist_size * TEST_MIN_DISTANCE)
-    clones_too_close = 0
-
-    # For each track in playlist check if it is too close to any of its clones. Only looks forward.
-    for track_index, track in enumerate(tracks):
-        for current_track_index in range(track_index + 1, len(tracks)):
-            if current_track_index - track_index >= min_distance:
-                # Min distance already reached, clones can not be too close
-                break
-            if tracks[current_track_index] == track:
-                track_name = track['name']
-                print(f'(!) Clones of track "{track_name}" too close! Indices: {track_index}, {current_track_index}')
-                clones_too_close += 1
-
-    if clones_too_close == 0:
+    min_distance = math.floor(len(tracks) * TEST_MIN_DISTANCE)
+    spacing = verify_clone_spacing(tracks, min_distance)
+
+    for track_index, clone_index, distance in spacing['violations']:
+        track_name = TRACKS.get_name(tracks[track_index])
+        print(f'(!) Clones of track "{track_name}" too close! Indices: {track_index}, {clone_index}, distance: {distance}')
+
+    if not spacing['violations']:
         print(f'\nMain playlist is well ordered!\n')
+    spacing['worst_distances'] = {TRACKS.get_uri(track_id): distance
+                                  for track_id, distance in spacing['worst_distances'].items()}
+    return spacing
+
+
+def verify_clone_spacing(tracks, min_distance):
+    """
+    Checks the distances between neighbouring clones in a single pass.
+    The distance between the last and the first clone of a track is measured
+    around the end of the playlist, since it is played on repeat.
+    Returns a dict with:
+    - violations: tuples of the form (index, clone index, distance) for clones closer than min_distance
+    - worst_distances: the smallest distance between clones of each track, by track ID
+    - histogram: how many times each distance between neighbouring clones occurs
+    """
+
+    playlist_size = len(tracks)
+    first_indices = {}
+    last_indices = {}
+    violations = []
+    worst_distances = {}
+    histogram = Counter()
+
+    def record(index, clone_index, distance):
+        track_id = tracks[index]
+        histogram[distance] += 1
+        worst_distances[track_id] = min(worst_distances.get(track_id, distance), distance)
+        if distance < min_distance:
+            violations.append((index, clone_index, distance))
+
+    for index, track_id in enumerate(tracks):
+        if track_id in last_indices:
+            record(last_indices[track_id], index, index - last_indices[track_id])
+        else:
+            first_indices[track_id] = index
+        last_indices[track_id] = index
+
+    for track_id, last_index in last_indices.items():
+        first_index = first_indices[track_id]
+        if last_index != first_index:
+            record(last_index, first_index, playlist_size - last_index + first_index)
+
+    return {'violations': violations, 'worst_distances': worst_distances, 'histogram': histogram}
 
 
 def check_clones_ok(sp, main_playlist_id, good_playlist_id, best_playlist_id):
-    """ Checks whether all double clones in the playlist are present
-    in the good playlist and the same for the triple ones """
-
-    all_tracks = get_tracks(sp, main_playlist_id)
-    good_tracks = get_tracks(sp, good_playlist_id)
-    best_tracks = get_tracks(sp, best_playlist_id)
-    checked_tracks = []
-
-    for track in all_tracks:
-        if track in checked_tracks:
-            continue
-        # Checking by URI because local tracks don't have ID
-        track_indices = [index for index, t in enumerate(all_tracks) if t['uri'] == track['uri']]
-        if len(track_indices) == 2:
-            checked_tracks.append(track)
-            if track not in good_tracks:
-                track_name = track['name']
-                print(
-                    f'(!) "{track_name}" is present twice in the main playlist, but not present in the good playlist.')
-        elif len(track_indices) == 3:
-            checked_tracks.append(track)
-            if track not in best_tracks:
-                track_name = track['name']
-                print(
-                    f'(!) "{track_name}" is present three times in the main playlist, but not present in the best playlist.')
+    """
+    Checks whether all double clones in the playlist are present in the good playlist and
+    the same for the triple ones, and whether the tracks in those are present as often as they should.
+    Returns a dict with the names of the missing, extra and wrong multiplicity tracks (see check_clone_playlists)
+    """
+
+    report = check_clone_playlists(get_tracks(sp, main_playlist_id), {
+        2: get_tracks(sp, good_playlist_id),
+        3: get_tracks(sp, best_playlist_id),
+    })
+    print_report(report, CLONE_PLAYLIST_LABELS)
+    return {problem: [TRACKS.get_name(entry[0]) for entry in entries] for problem, entries in report.items()}
 
 
 def get_youtube_search_url(artist_name: str, track_name: str) -> str:
     """ Returns the URL to a YouTube search for
     the given song by the given artist """
 
-    query = f'{artist_name} {track_name}'.replace(' ', '+')
+    query = quote_plus(f'{artist_name} {track_name}')
     return f'https://www.youtube.com/results?search_query={query}'
 
 
-def get_last_occurrence_index(text, char):
-    """ Returns the index of the last occurrence of the given char in the given text """
-
-    return len(text) - 1 - text[::-1].index(char)
-
-
 def get_track_name_core(track_name):
     """ Returns the most significant part of a track name.
     I.e. strips away things like featured artists """
@@ -155,6 +249,14 @@ def get_track_name_core(track_name):
     return stripped.strip()
 
 
+def normalize_name(name):
+    """ Returns the name in lowercase, without accents and with only letters, digits and single spaces """
+
+    decomposed = unicodedata.normalize('NFKD', name)
+    without_accents = ''.join(char for char in decomposed if not unicodedata.combining(char))
+    return ' '.join(re.sub(r'[^\w\s]', ' ', without_accents.lower()).split())
+
+
 class CustomLogger:
     """ Used to suppress YoutubeDL output """
 
@@ -0,0 +1,126 @@
+import json
+import os
+from threading import Lock
+from urllib.parse import urlparse, parse_qs, quote
+
+from constants import RESOLVE_WORKERS
+from util import get_track_name_core, normalize_name
+
+# Markers after which YouTube embeds the search results as JSON
+INITIAL_DATA_MARKERS = ('var ytInitialData = ', 'window["ytInitialData"] = ')
+
+
+class YoutubeResolver:
+    """
+    Resolves tracks to YouTube videos through the YouTube search page.
+    All searches share one pooled HTTP session and the results of every
+    search page are cached. If a fixtures directory is given, the search
+    pages are read from local HTML files instead, e.g. for offline testing
+    """
+
+    def __init__(self, fixtures_dir=None):
+        # Imported only here, since requests is slow to import
+        import requests
+        from requests.adapters import HTTPAdapter
+
+        self.fixtures_dir = fixtures_dir
+        self.session = requests.Session()
+        self.session.mount('https://', HTTPAdapter(pool_connections=1, pool_maxsize=RESOLVE_WORKERS))
+        # Search URL to a list of tuples of the form (title, video ID)
+        self.search_results = {}
+        self.lock = Lock()
+
+    def get_first_result_url(self, search_url, track_name):
+        """ Returns the URL of the first search result matching the track name, or None if there is none """
+
+        video_id = self.get_first_result_video_id(search_url, track_name)
+        return get_video_url(video_id) if video_id else None
+
+    def get_first_result_video_id(self, search_url, track_name):
+        """ Returns the video ID of the first search result matching the track name, or None if there is none """
+
+        return find_video_id(self.get_search_results(search_url), track_name)
+
+    def get_search_results(self, search_url):
+        """ Returns the results of the given search as tuples of the form (title, video ID) """
+
+        with self.lock:
+            if search_url in self.search_results:
+                return self.search_results[search_url]
+        search_results = extract_search_results(self.get_search_page(search_url))
+        with self.lock:
+            self.search_results[search_url] = search_results
+        return search_results
+
+    def get_search_page(self, search_url):
+        """ Returns the HTML of the given search page """
+
+        if self.fixtures_dir:
+            with open(get_fixture_path(self.fixtures_dir, search_url), encoding='utf-8') as fixture_file:
+                return fixture_file.read()
+        response = self.session.get(search_url)
+        response.raise_for_status()
+        return response.text
+
+
+def get_video_url(video_id):
+    """ Returns the URL of the YouTube video with the given ID """
+
+    return f'https://www.youtube.com/watch?v={video_id}'
+
+
+def get_fixture_path(fixtures_dir, search_url):
+    """ Returns the path of the HTML file holding the given search page, named after the search query """
+
+    query = parse_qs(urlparse(search_url).query)['search_query'][0]
+    return os.path.join(fixtures_dir, f'{quote(query, safe="")}.html')
+
+
+def extract_search_results(page):
+    """
+    Returns the video results from the JSON embedded in a YouTube search page,
+    as tuples of the form (title, video ID), in the order they are shown.
+    Raises a ValueError if the page has no results JSON, e.g. a consent or bot check page
+    """
+
+    for marker in INITIAL_DATA_MARKERS:
+        start = page.find(marker)
+        if start != -1:
+            initial_data, _ = json.JSONDecoder().raw_decode(page, start + len(marker))
+            break
+    else:
+        raise ValueError('The YouTube page has no search results data')
+
+    search_results = []
+    # Depth-first, so that the results keep their order
+    stack = [initial_data]
+    while stack:
+        node = stack.pop()
+        if isinstance(node, dict):
+            video = node.get('videoRenderer')
+            if isinstance(video, dict) and 'videoId' in video:
+                search_results.append((get_video_title(video), video['videoId']))
+                continue
+            stack.extend(reversed(list(node.values())))
+        elif isinstance(node, list):
+            stack.extend(reversed(node))
+    return search_results
+
+
+def get_video_title(video):
+    """ Returns the title of a video result """
+
+    title = video.get('title', {})
+    if 'simpleText' in title:
+        return title['simpleText']
+    return ''.join(run.get('text', '') for run in title.get('runs', []))
+
+
+def find_video_id(search_results, track_name):
+    """ Returns the ID of the first video whose title contains the core of the track name, or None """
+
+    track_name_core = normalize_name(get_track_name_core(track_name))
+    for title, video_id in search_results:
+        if track_name_core in normalize_name(title):
+            return video_id
+    return None
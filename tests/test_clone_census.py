@@ -0,0 +1,20 @@
+from clone_census import check_clone_playlists
+
+
+def test_track_of_a_playlist_is_reported_once():
+    # Track 1 is in Best but occurs 4 times, more than any playlist is for
+    report = check_clone_playlists([1, 1, 1, 1, 2, 2, 3], {2: [2], 3: [1]})
+
+    assert report == {'missing': [], 'extra': [], 'wrong_multiplicity': [(1, 4, 3)]}
+
+
+def test_track_in_no_playlist_is_reported():
+    report = check_clone_playlists([1, 1, 1, 1, 2, 2, 3, 3, 3], {2: [], 3: []})
+
+    assert report == {'missing': [(2, 2), (3, 3)], 'extra': [], 'wrong_multiplicity': [(1, 4, None)]}
+
+
+def test_extra_tracks_are_reported():
+    report = check_clone_playlists([1, 1, 2], {2: [1, 3], 3: [2]})
+
+    assert report == {'missing': [], 'extra': [(3, 2)], 'wrong_multiplicity': [(2, 1, 3)]}
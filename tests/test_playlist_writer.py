@@ -0,0 +1,37 @@
+import random
+
+from playlist_writer import plan_moves
+
+
+def apply_moves(tracks, calls):
+    """ Makes the planned reorder calls on a list, the way the API does """
+
+    tracks = list(tracks)
+    for _, kwargs in calls:
+        range_start, insert_before, range_length = \
+            kwargs['range_start'], kwargs['insert_before'], kwargs['range_length']
+        moved_tracks = tracks[range_start:range_start + range_length]
+        del tracks[range_start:range_start + range_length]
+        insert_at = insert_before if insert_before < range_start else insert_before - range_length
+        tracks[insert_at:insert_at] = moved_tracks
+    return tracks
+
+
+def test_moves_reach_the_target_order():
+    rng = random.Random(0)
+    for _ in range(500):
+        target_tracks = [rng.randrange(20) for _ in range(rng.randrange(40))]
+        current_tracks = list(target_tracks)
+        rng.shuffle(current_tracks)
+
+        assert apply_moves(current_tracks, plan_moves(current_tracks, target_tracks)) == target_tracks
+
+
+def test_neighbouring_tracks_are_moved_together():
+    calls = plan_moves([4, 5, 6, 1, 2, 3], [1, 2, 3, 4, 5, 6])
+
+    assert [kwargs['range_length'] for _, kwargs in calls] == [3]
+
+
+def test_tracks_in_order_are_not_moved():
+    assert plan_moves([1, 2, 3], [1, 2, 3]) == []
@@ -0,0 +1,65 @@
+import os
+
+import pytest
+
+from conversion import resolve_track_url
+from resolution_cache import ResolutionCache
+from util import get_youtube_search_url
+from youtube_resolver import YoutubeResolver, extract_search_results, find_video_id
+
+FIXTURES_DIR = os.path.join(os.path.dirname(__file__), 'fixtures', 'youtube')
+
+
+def read_fixture(artist_name, track_name):
+    """ Returns the fixture of the search page for the given track """
+
+    resolver = YoutubeResolver(FIXTURES_DIR)
+    return resolver.get_search_page(get_youtube_search_url(artist_name, track_name))
+
+
+def test_results_are_extracted_in_the_order_they_are_shown():
+    search_results = extract_search_results(read_fixture('AC/DC', 'Are You Ready? [Live]*'))
+
+    assert search_results == [
+        ('Top 10 live concerts', 'unrelated01'),
+        ('AC/DC - Are You Ready? [Live]* (Official Video)', 'matching001'),
+        ('Are You Ready (Live at River Plate)', 'matching002'),
+    ]
+
+
+def test_results_are_extracted_after_the_window_marker():
+    search_results = extract_search_results(read_fixture('Beyonce', 'Deja Vu (feat. Jay-Z)'))
+
+    assert search_results == [('Beyoncé - Déjà Vu ft. Jay-Z', 'beyonce0001')]
+
+
+def test_page_without_results_data_raises():
+    with pytest.raises(ValueError):
+        extract_search_results(read_fixture('Consent', 'Page'))
+
+
+def test_first_result_containing_the_track_name_is_found():
+    resolver = YoutubeResolver(FIXTURES_DIR)
+    search_url = get_youtube_search_url('AC/DC', 'Are You Ready? [Live]*')
+
+    assert resolver.get_first_result_video_id(search_url, 'Are You Ready? [Live]*') == 'matching001'
+
+
+def test_track_name_matches_without_accents_and_featured_artists():
+    resolver = YoutubeResolver(FIXTURES_DIR)
+    search_url = get_youtube_search_url('Beyonce', 'Deja Vu (feat. Jay-Z)')
+
+    assert resolver.get_first_result_video_id(search_url, 'Deja Vu (feat. Jay-Z)') == 'beyonce0001'
+
+
+def test_no_video_is_found_without_a_matching_title():
+    assert find_video_id([('Top 10 live concerts', 'unrelated01')], 'Are You Ready? [Live]*') is None
+
+
+def test_unparsable_page_is_not_cached_as_not_found(tmp_path):
+    resolution_cache = ResolutionCache(str(tmp_path / 'resolution_cache.json'))
+    track = {'id': 'consent', 'uri': 'spotify:track:consent', 'artist': 'Consent', 'name': 'Page'}
+
+    with pytest.raises(ValueError):
+        resolve_track_url(YoutubeResolver(FIXTURES_DIR), resolution_cache, track)
+    assert resolution_cache.get(track) == (False, None)